@@ -8,6 +8,7 @@ from src.processes import Processes
 from src.get_data import HistoricalData
 from src.util import parse_json, dollar_format
 from src.chart_visual import chart_visuals
+from src.ohlc import read_ohlc
 import plotly.graph_objects as go
 import pandas as pd
 
@@ -21,9 +22,7 @@ import datetime as dt
 # histdata = HistoricalData(config["binance"]["API_KEY"], config["binance"]["API_SECRET"])
 # df = histdata.getKline("SOLUSDC","12h").dropna()
 
-df = pd.read_csv("test_data.csv").dropna()
-df["opentime"] = pd.to_datetime(df.opentime)
-df["closetime"] = pd.to_datetime(df.closetime)
+df = read_ohlc("test_data.csv").dropna()
 #######################
 
 #######################
@@ -129,7 +128,7 @@ app.layout = html.Div(
                         html.H3("Select a process"),
                         dcc.Dropdown(
                             id = "process-select-dd",
-                            options = [{"label" : "GBM", "value" : "GBM"},{"label" : "JDP", "value" : "JDP"},{"label" : "OU", "value" : "OU"}],
+                            options = [{"label" : "GBM", "value" : "GBM"},{"label" : "JDP", "value" : "JDP"},{"label" : "OU", "value" : "OU"},{"label" : "GARCH", "value" : "GARCH"},{"label" : "Heston", "value" : "HESTON"}],
                             value = "GBM"
                         )
                     ],
@@ -193,7 +192,13 @@ app.layout = html.Div(
 )
 def update_ppa(process_selected : str) -> go.Figure:
     ppa = process.str_select(process_selected)
-    fig = produce_var_results(ppa,df,False)
+    fig = produce_var_results(
+        ppa,
+        df,
+        False,
+        process.control_mean(process_selected, ppa.nPeriods),
+        batch_size=process.batch_size(ppa.nSims),
+    )
     return fig
 
 
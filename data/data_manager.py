@@ -1,15 +1,38 @@
 from src.get_data import HistoricalData
 import datetime as dt
+import numpy as np
 import pandas as pd
-from src.processes import Processes
+from src.processes import DTYPES, Processes
+from src.simulation import SimulationResult
+from src.var import var_term_structure
+from src.adaptive import AdaptiveVaRResult, adaptive_var
 import asyncio
-from typing import Tuple
+from typing import Dict, List, Optional, Tuple
+from src.portfolio import returns_panel
 from src.util import parse_json
+from data.result_cache import ResultCache
+from src.kline_store import KlineStore, klines_to_table
+from src.ohlc import ohlc_frame
+from src.calibration import calibration_cache
+from src.streaming import BinanceKlineStream, LiveMarket
+
+# Seconds before OHLC data is fetched again
+OHLC_TTL = 3600
 
 class DataManager:
     _instance = None
     _data_cache = {}
     _last_loaded = {}
+    # Simulation results keyed by
+    # (symbol, interval, data version, process, nPeriods, nSims, seed, dtype)
+    _results = ResultCache(ttl=OHLC_TTL)
+    # Floating point type price paths are simulated in, see Processes
+    dtype = "float64"
+    # Local columnar kline history, topped up from the exchange on load
+    kline_store = KlineStore()
+    _client = None
+    # Live markets by (symbol, interval), fed by a websocket stream
+    _streams = {}
 
     def __new__(cls, api_key: str, api_secret: str):
         if cls._instance is None:
@@ -18,54 +41,265 @@ class DataManager:
             cls._instance = super(DataManager, cls).__new__(cls)
         return cls._instance
 
-    def grab_ohlc_data(self, force_reload=False) -> pd.DataFrame:
-        cache_key = "ohlc_data"
+    def grab_ohlc_data(
+        self, force_reload=False, symbol: str = "SOLUSDC", interval: str = "12h"
+    ) -> pd.DataFrame:
+        cache_key = f"ohlc_data_{symbol}_{interval}"
 
+        # A live stream appends every closed bar to the cached frame, so it
+        # never expires
         if (
             not force_reload
             and cache_key in self._data_cache
             and cache_key in self._last_loaded
-            and (dt.datetime.now() - self._last_loaded[cache_key]).seconds < 3600
+            and (
+                (symbol, interval) in self._streams
+                or (dt.datetime.now() - self._last_loaded[cache_key]).total_seconds() < OHLC_TTL
+            )
         ):
             return self._data_cache[cache_key]
         else:
-            self.load_ohlc_data()
-            self._last_loaded[cache_key] = dt.datetime.now()
+            self.load_ohlc_data(symbol, interval, cache_key)
             return self._data_cache[cache_key]
 
-    def load_ohlc_data(self) -> pd.DataFrame:
-        cache_key = "ohlc_data"
-        binance = HistoricalData(self.__api_key, self.__api_secret)
-        df = binance.getKline("SOLUSDC", "12h").dropna()
+    def load_ohlc_data(
+        self, symbol: str = "SOLUSDC", interval: str = "12h", cache_key: str | None = None
+    ) -> pd.DataFrame:
+        cache_key = cache_key or f"ohlc_data_{symbol}_{interval}"
+        df = self.kline_store.load(symbol, interval, self.kline_client()).dropna()
         self._data_cache[cache_key] = df
         self._last_loaded[cache_key] = dt.datetime.now()
         return df
 
+    def kline_client(self):
+        # Created on first use: building a binance.Client pings the exchange
+        if DataManager._client is None:
+            DataManager._client = HistoricalData(self.__api_key, self.__api_secret).client
+        return DataManager._client
+
+    def set_kline_client(self, client) -> None:
+        # Swap in another client, e.g. a LocalKlineClient to run offline
+        DataManager._client = client
+
+    def set_dtype(self, dtype: str) -> None:
+        # float32 halves the memory of large runs; cached float64 results
+        # stay valid and are served again when switching back
+        if np.dtype(dtype).name not in DTYPES:
+            raise ValueError(f"Unsupported dtype: {dtype}")
+        DataManager.dtype = np.dtype(dtype).name
+
+    def start_stream(
+        self,
+        symbol: str = "SOLUSDC",
+        interval: str = "12h",
+        stream=None,
+        capacity: int = 1000,
+        drift_threshold: float = 0.1,
+    ) -> LiveMarket:
+        # Seed a live market from history, then let closed bars from the
+        # websocket (or any stream with the same interface) update it. Every
+        # bar extends the cached OHLC data; simulations keep the data as of
+        # the last drift, and fits and results are dropped only when the
+        # return distribution drifts.
+        self.stop_stream(symbol, interval)
+        market = LiveMarket(capacity, drift_threshold).seed(
+            self.grab_ohlc_data(False, symbol, interval)
+        )
+        market.bar_listeners.append(lambda row: self._on_bar(symbol, interval, row))
+        market.listeners.append(lambda frame: self._on_drift(symbol, interval))
+        if stream is None:
+            stream = BinanceKlineStream(symbol, interval, self.__api_key, self.__api_secret)
+        stream.subscribe(market.on_kline)
+        self._streams[(symbol, interval)] = (market, stream)
+        stream.start()
+        return market
+
+    def stop_stream(self, symbol: str = "SOLUSDC", interval: str = "12h") -> None:
+        entry = self._streams.pop((symbol, interval), None)
+        if entry is not None:
+            entry[1].stop()
+
+    def _on_bar(self, symbol: str, interval: str, row: list) -> None:
+        cache_key = f"ohlc_data_{symbol}_{interval}"
+        history = self._data_cache.get(cache_key)
+        bar = ohlc_frame(klines_to_table([row]))
+        # Bars already in the history the market was seeded from are skipped
+        if history is None or history.empty or bar.closetime.iloc[0] <= history.closetime.iloc[-1]:
+            return
+        bar["log_returns"] = np.log(bar.close / history.close.iloc[-1])
+        self._data_cache[cache_key] = pd.concat([history, bar], ignore_index=True)
+        self._last_loaded[cache_key] = dt.datetime.now()
+
+    def _on_drift(self, symbol: str, interval: str) -> None:
+        prefix = f"processes_{symbol}_{interval}_"
+        stale = [key for key in self._data_cache if key.startswith(prefix)]
+        fingerprints = {self._data_cache.pop(key).fingerprint for key in stale}
+        calibration_cache.invalidate(lambda key: key[0] in fingerprints)
+        self._results.invalidate(lambda key: key[:2] == (symbol, interval))
+
+    def grab_returns_panel(
+        self, symbols: List[str], interval: str = "12h", force_reload=False
+    ) -> pd.DataFrame:
+        # Log returns of every symbol in the book, aligned on closetime
+        return returns_panel(
+            {symbol: self.grab_ohlc_data(force_reload, symbol, interval) for symbol in symbols}
+        )
+
+    def grab_processes(
+        self,
+        seed: int | None = None,
+        symbol: str = "SOLUSDC",
+        interval: str = "12h",
+        force_reload=False,
+    ) -> Processes:
+        # One Processes per dataset and seed, so fitted parameters survive
+        # until the OHLC data is reloaded; its engine runs live in _results.
+        # While a stream is live it is kept until _on_drift drops it, so its
+        # fits, last price and data fingerprint, which versions the result
+        # keys, change only on drift even though every bar extends the data
+        ohlc = self.grab_ohlc_data(force_reload, symbol, interval)
+        cache_key = f"processes_{symbol}_{interval}_{seed}"
+        proc = self._data_cache.get(cache_key)
+        streaming = (symbol, interval) in self._streams and not force_reload
+        if (
+            proc is None
+            or (proc.returns is not ohlc and not streaming)
+            or proc.dtype != self.dtype
+        ):
+            # The result cache owns the simulations, so its bound is the
+            # only thing keeping them in memory
+            proc = Processes(ohlc, seed, dtype=self.dtype, memoise=False)
+            self._data_cache[cache_key] = proc
+        return proc
+
+    @staticmethod
+    def _result_key(
+        proc: Processes,
+        process_selected: str,
+        nPeriods: int,
+        nSims: int,
+        seed: int | None,
+        symbol: str,
+        interval: str,
+    ) -> tuple:
+        # The data fingerprint versions the key, so reloaded data that
+        # changed never serves old results
+        return (
+            symbol,
+            interval,
+            proc.fingerprint,
+            process_selected.upper(),
+            nPeriods,
+            nSims,
+            seed,
+            proc.dtype.name,
+        )
+
     def grab_price_path(
         self,
         force_reload=False,
         nPeriods: int = 10,
         nSims: int = 10,
-        seed: int = 1234
+        seed: int = 1234,
+        symbol: str = "SOLUSDC",
+        interval: str = "12h",
     ) -> Tuple[Processes, pd.DataFrame]:
-        cache_key = "price_path_data"
-        if (
-            not force_reload
-            and cache_key in self._data_cache
-            and cache_key in self._last_loaded
-            and (dt.datetime.now() - self._last_loaded[cache_key]).seconds < 3600
-        ):
-            return self._data_cache["price_paths_object"], self._data_cache["price_paths_summary"]
-        else:
-            asyncio.run(self.load_price_paths(nPeriods, nSims,seed))
-            return self._data_cache["price_paths_object"], self._data_cache["price_paths_summary"]
-
-    async def load_price_paths(self,nPeriods: int, nSims: int, seed: int|None = None):
-        proc = Processes(self.grab_ohlc_data(), seed)
-        output = await proc.compare_processes(nPeriods, nSims)
-        self._data_cache["price_paths_object"] = proc
-        self._data_cache["price_paths_summary"] = output
-        self._last_loaded["price_path_data"] = dt.datetime.now()
+        proc = self.grab_processes(seed, symbol, interval, force_reload)
+        key = self._result_key(proc, "COMPARE", nPeriods, nSims, seed, symbol, interval)
+        summary = None if force_reload else self._results.get(key)
+        if summary is None:
+            summary = asyncio.run(self.load_price_paths(nPeriods, nSims, seed, symbol, interval))
+        return proc, summary
+
+    async def load_price_paths(
+        self,
+        nPeriods: int,
+        nSims: int,
+        seed: int | None = None,
+        symbol: str = "SOLUSDC",
+        interval: str = "12h",
+    ) -> pd.DataFrame:
+        proc = self.grab_processes(seed, symbol, interval)
+        simulations = await proc.simulate_all(nPeriods, nSims)
+        for process_selected, result in simulations.items():
+            self._results.put(
+                self._result_key(proc, process_selected, nPeriods, nSims, seed, symbol, interval),
+                result,
+            )
+        return self._results.put(
+            self._result_key(proc, "COMPARE", nPeriods, nSims, seed, symbol, interval),
+            proc.comparison_table(simulations),
+        )
+
+    def grab_simulation(
+        self,
+        process_selected: str,
+        nPeriods: int = 10,
+        nSims: int = 10,
+        seed: int = 1234,
+        symbol: str = "SOLUSDC",
+        interval: str = "12h",
+    ) -> SimulationResult:
+        # Price paths of one engine, simulated only on a cache miss
+        proc = self.grab_processes(seed, symbol, interval)
+        key = self._result_key(proc, process_selected, nPeriods, nSims, seed, symbol, interval)
+        paths = self._results.get(key)
+        if paths is None:
+            paths = self._results.put(key, proc.simulate(process_selected, nPeriods, nSims))
+        return paths
+
+    def grab_var_term_structure(
+        self,
+        process_selected: str,
+        nPeriods: int = 10,
+        nSims: int = 10,
+        seed: int = 1234,
+        symbol: str = "SOLUSDC",
+        interval: str = "12h",
+        confidence: Tuple[float, ...] = (0.95, 0.99),
+    ) -> pd.DataFrame:
+        # 1 to nPeriods bar VaR/ES and fan quantiles off the cached paths
+        proc = self.grab_processes(seed, symbol, interval)
+        paths = self.grab_simulation(process_selected, nPeriods, nSims, seed, symbol, interval)
+        control_means = None
+        if proc.control_mean(process_selected, nPeriods) is not None:
+            control_means = np.array(
+                [proc.control_mean(process_selected, period) for period in paths.periods]
+            )
+        return var_term_structure(paths, confidence, control_means=control_means)
+
+    def grab_path_metrics(
+        self,
+        process_selected: str,
+        nPeriods: int = 10,
+        nSims: int = 10,
+        barrier: Optional[float] = None,
+        seed: int = 1234,
+        symbol: str = "SOLUSDC",
+        interval: str = "12h",
+        confidence: Tuple[float, ...] = (0.95, 0.99),
+    ) -> dict:
+        # Drawdown, time under water and barrier breach statistics streamed
+        # from fresh paths, so long horizons never hold the full price array
+        proc = self.grab_processes(seed, symbol, interval)
+        metrics = proc.path_metrics(process_selected, nPeriods, nSims, barrier)
+        return metrics.summary(confidence)
+
+    def cache_stats(self) -> Dict[str, float]:
+        return self._results.stats()
+
+    def grab_adaptive_var(
+        self,
+        process_selected: str,
+        nPeriods: int = 10,
+        rel_tol: float = 0.01,
+        time_budget: float | None = 5.0,
+        seed: int = 1234
+    ) -> AdaptiveVaRResult:
+        proc = self.grab_processes(seed)
+        return adaptive_var(
+            proc, process_selected, nPeriods, rel_tol=rel_tol, time_budget=time_budget
+        )
 
 
 config = parse_json("config.json")
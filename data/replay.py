@@ -0,0 +1,162 @@
+import argparse
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field
+from typing import Optional, Sequence
+from data.data_manager import DataManager, datamanager
+from src.calibration import calibration_cache
+from src.kline_store import KlineStore, LocalKlineClient, frame_to_klines
+from src.processes import DTYPES
+from src.ohlc import read_ohlc
+from src.streaming import ReplayKlineStream
+from src.var import produce_var_results
+
+# Per bar timings, in seconds. lag is how late the bar reached the pipeline
+# against the replay schedule; total runs from the scheduled time to VaR
+# being available, so it includes lag.
+REPLAY_STAGES = ("lag", "ingest", "calibrate", "simulate", "var", "total")
+
+
+@dataclass
+class ReplayReport:
+    bars: int
+    elapsed: float
+    speedup: Optional[float]
+    latencies: pd.DataFrame = field(repr=False)
+
+    @property
+    def throughput(self) -> float:
+        # Bars per second achieved, bounded by the schedule when replaying
+        # with a speedup
+        return self.bars / self.elapsed if self.elapsed > 0 else np.nan
+
+    @property
+    def capacity(self) -> float:
+        # Bars per second the pipeline could sustain back to back
+        busy = (self.latencies.total - self.latencies.lag).sum()
+        return self.bars / busy if busy > 0 else np.nan
+
+    def percentiles(self, q: Sequence[float] = (50, 90, 99)) -> pd.DataFrame:
+        # Latency percentiles (and max) of every stage in milliseconds
+        summary = self.latencies.quantile(np.asarray(q) / 100)
+        summary.index = [f"p{p:g}" for p in q]
+        summary.loc["max"] = self.latencies.max()
+        return (summary * 1000).T
+
+
+def replay(
+    path: str = "test_data.csv",
+    symbol: str = "SOLUSDC",
+    interval: str = "1m",
+    process_selected: str = "GBM",
+    warmup: int = 500,
+    bars: Optional[int] = None,
+    speedup: Optional[float] = None,
+    nPeriods: int = 10,
+    nSims: int = 10_000,
+    seed: int = 1234,
+    manager: Optional[DataManager] = None,
+    dtype: str = "float64",
+) -> ReplayReport:
+    # Load test of the full pipeline on recorded klines (CSV, Parquet or
+    # Feather) without touching the exchange. The first `warmup` bars are
+    # history; every later bar is emitted by a ReplayKlineStream and, once
+    # the local client has released it, pushed through what the dashboard
+    # does on a refresh: store sync and reload, a new Processes and its
+    # calibration, the engine's paths and produce_var_results. The manager's
+    # kline store and client are swapped for a temporary store and a
+    # LocalKlineClient for the duration, and paths are simulated in dtype.
+    manager = manager or datamanager
+    recorded = read_ohlc(path)
+    rows = frame_to_klines(recorded)
+    rows = rows[: len(rows) if bars is None else warmup + bars]
+    client = LocalKlineClient(recorded, visible=warmup)
+    stream = ReplayKlineStream(rows[warmup:], symbol, interval, speedup)
+    timings = []
+
+    def on_kline(row: list) -> None:
+        started = time.perf_counter()
+        client.advance(1)
+        ohlc = manager.grab_ohlc_data(True, symbol, interval)
+        ingested = time.perf_counter()
+        proc = manager.grab_processes(seed, symbol, interval)
+        proc.params(process_selected)
+        calibrated = time.perf_counter()
+        paths = manager.grab_simulation(process_selected, nPeriods, nSims, seed, symbol, interval)
+        simulated = time.perf_counter()
+        produce_var_results(
+            paths,
+            ohlc,
+            False,
+            proc.control_mean(process_selected, nPeriods),
+            batch_size=proc.batch_size(nSims),
+        )
+        done = time.perf_counter()
+        timings.append(
+            (
+                started - stream.due,
+                ingested - started,
+                calibrated - ingested,
+                simulated - calibrated,
+                done - simulated,
+                done - stream.due,
+            )
+        )
+
+    # Every bar pays for its own fit and paths rather than hitting what an
+    # earlier replay of the same file left behind
+    manager._results.invalidate(lambda key: key[:2] == (symbol, interval))
+    calibration_cache.clear()
+    previous_store = manager.kline_store
+    previous_client = DataManager._client
+    previous_dtype = manager.dtype
+    with tempfile.TemporaryDirectory() as root:
+        try:
+            manager.kline_store = KlineStore(root)
+            manager.set_kline_client(client)
+            manager.set_dtype(dtype)
+            manager.grab_ohlc_data(True, symbol, interval)
+            stream.subscribe(on_kline)
+            started = time.perf_counter()
+            emitted = stream.run()
+            elapsed = time.perf_counter() - started
+        finally:
+            manager.kline_store = previous_store
+            manager.set_kline_client(previous_client)
+            manager.set_dtype(previous_dtype)
+    latencies = pd.DataFrame(timings, columns=REPLAY_STAGES)
+    return ReplayReport(emitted, elapsed, speedup, latencies)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded klines through the VaR pipeline")
+    parser.add_argument("path", nargs="?", default="test_data.csv")
+    parser.add_argument("--symbol", default="SOLUSDC")
+    parser.add_argument("--interval", default="1m")
+    parser.add_argument("--process", default="GBM")
+    parser.add_argument("--warmup", type=int, default=500)
+    parser.add_argument("--bars", type=int, default=None)
+    parser.add_argument("--speedup", type=float, default=None)
+    parser.add_argument("--periods", type=int, default=10)
+    parser.add_argument("--sims", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--dtype", choices=DTYPES, default="float64")
+    args = parser.parse_args()
+    report = replay(
+        args.path,
+        args.symbol,
+        args.interval,
+        args.process,
+        args.warmup,
+        args.bars,
+        args.speedup,
+        args.periods,
+        args.sims,
+        args.seed,
+        dtype=args.dtype,
+    )
+    print(f"{report.bars} bars in {report.elapsed:.2f}s")
+    print(f"throughput {report.throughput:.1f} bars/s, capacity {report.capacity:.1f} bars/s")
+    print(report.percentiles().round(2).to_string())
@@ -0,0 +1,37 @@
+import sys
+import numpy as np
+import pandas as pd
+from typing import Any
+from src.cache import LRUCache
+from src.simulation import SimulationResult
+
+
+def _nbytes(value: Any) -> int:
+    # Rough footprint of a cached result
+    if isinstance(value, pd.DataFrame):
+        # Summed per dtype: memory_usage builds a Series per column, which
+        # costs more than simulating a frame with thousands of paths
+        itemsizes = sum(
+            getattr(dtype, "itemsize", 8) * count
+            for dtype, count in value.dtypes.value_counts().items()
+        )
+        return int(itemsizes * len(value) + value.index.memory_usage())
+    if isinstance(value, (np.ndarray, SimulationResult)):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(item) for item in value)
+    return sys.getsizeof(value)
+
+
+class ResultCache(LRUCache):
+    # Thread-safe LRU of simulation results with a time to live. Entries are
+    # evicted least recently used first once either max_entries or max_bytes
+    # is exceeded, and dropped on access once older than ttl seconds.
+
+    def __init__(
+        self,
+        ttl: float = 3600.0,
+        max_entries: int = 128,
+        max_bytes: int = 512 * 1024**2,
+    ) -> None:
+        super().__init__(max_entries, max_bytes, ttl, _nbytes)
@@ -3,6 +3,7 @@ from dash import html, dcc, Input, Output, callback, dash_table
 import plotly.graph_objects as go
 from data.data_manager import datamanager
 from src.var import produce_var_results
+from src.util import dollar_format
 from typing import Tuple
 import pandas as pd
 dash.register_page(__name__,path = '/price-paths-risk')
@@ -29,7 +30,9 @@ layout = html.Div(
                             options = [
                                 {"label" : "GBM", "value" : "GBM"},
                                 {"label" : "JDP", "value" : "JDP"},
-                                {"label" : "OU", "value" : "OU"}
+                                {"label" : "OU", "value" : "OU"},
+                                {"label" : "GARCH", "value" : "GARCH"},
+                                {"label" : "Heston", "value" : "HESTON"}
                             ],
                             value = "GBM"
                         ),
@@ -46,6 +49,18 @@ layout = html.Div(
                             type = "number",
                             value = 10,
                             placeholder=10
+                        ),
+                        html.H3("Adaptive VaR tolerance (%)"),
+                        dcc.Input(
+                            id = "rel-tol",
+                            type = "number",
+                            value = 1,
+                            placeholder=1
+                        ),
+                        dcc.Loading(
+                            id = "adaptive-loading",
+                            children = [html.P(id = "adaptive-var")],
+                            type = "circle"
                         )
                     ],
                     className = "graph-module",
@@ -136,9 +151,35 @@ layout = html.Div(
     ]
 )
 def update_ppa(process_selected : str, new_nperiods:int, new_nsims: int) -> Tuple[go.Figure, dict]:
-    if new_nperiods > 0 or new_nsims > 0:
-            process, comparison_table = datamanager.grab_price_path(True,new_nperiods,new_nsims)
-    ppa = process.str_select(process_selected)
-    fig = produce_var_results(ppa,returns,False)
+    if not new_nperiods or not new_nsims or new_nperiods <= 0 or new_nsims <= 0:
+        new_nperiods, new_nsims = nPeriods, nSims
+    # Both are served from the result cache when these inputs were seen before
+    process, comparison_table = datamanager.grab_price_path(False,new_nperiods,new_nsims)
+    ppa = datamanager.grab_simulation(process_selected, new_nperiods, new_nsims)
+    fig = produce_var_results(
+        ppa,
+        returns,
+        False,
+        process.control_mean(process_selected, ppa.nPeriods),
+        batch_size=process.batch_size(ppa.nSims),
+    )
+
+    return fig, comparison_table.to_dict("records")
 
-    return fig, comparison_table.to_dict("records")
\ No newline at end of file
+@callback(
+    Output("adaptive-var", "children"),
+    [
+        Input("process-select-dd","value"),
+        Input("n-periods", "value"),
+        Input("rel-tol", "value")
+    ]
+)
+def update_adaptive_var(process_selected : str, new_nperiods: int, rel_tol: float) -> str:
+    if not new_nperiods or not rel_tol or rel_tol <= 0:
+        return ""
+    result = datamanager.grab_adaptive_var(process_selected, new_nperiods, rel_tol / 100)
+    return (
+        f"P95 VaR {dollar_format(result.var)} ± {dollar_format(result.var_half_width)}, "
+        f"ES {dollar_format(result.es)} ± {dollar_format(result.es_half_width)} "
+        f"from {result.n_paths:,} paths ({result.stop_reason.replace('_', ' ')})"
+    )
\ No newline at end of file
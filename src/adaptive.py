@@ -0,0 +1,114 @@
+import time
+import numpy as np
+from dataclasses import dataclass, field
+from typing import List, Optional
+from src.processes import Processes, STREAM_BLOCK
+from src.risk_metrics import LossDigest, batch_digests
+
+
+@dataclass
+class AdaptiveVaRResult:
+    process: str
+    confidence: float
+    var: float
+    es: float
+    var_half_width: float
+    es_half_width: float
+    n_paths: int
+    n_batches: int
+    elapsed: float
+    converged: bool
+    stop_reason: str
+    digest: LossDigest = field(repr=False)
+    batches: List[LossDigest] = field(repr=False)
+
+
+def adaptive_var(
+    process: Processes,
+    process_selected: str,
+    nPeriods: int,
+    confidence: float = 0.95,
+    rel_tol: float = 0.01,
+    time_budget: Optional[float] = None,
+    batch_size: int = STREAM_BLOCK,
+    min_batches: int = 10,
+    max_sims: int = 10_000_000,
+    z: float = 1.96,
+) -> AdaptiveVaRResult:
+    # Simulate independent batches of terminal losses until the batch-means
+    # confidence intervals of both VaR and ES are within rel_tol of their
+    # estimates, the time budget (seconds) runs out or max_sims is reached.
+    # Batches are whole stream blocks, so a given seed always stops after the
+    # same number of paths when no time budget is set.
+    batch_size = max(STREAM_BLOCK, batch_size - batch_size % STREAM_BLOCK)
+    last_price = process.returns.close.iloc[-1]
+    control_mean = process.control_mean(process_selected, nPeriods)
+    started = time.perf_counter()
+    batches = []
+    # One running merge of every batch, plus the running mean and sum of
+    # squared deviations (Welford) of the per batch VaR and ES for their
+    # batch-means standard errors, so each batch costs the same however many
+    # came before it
+    digest = LossDigest()
+    estimate_mean = np.zeros(2)
+    estimate_m2 = np.zeros(2)
+    n_paths = 0
+    stop_reason = "max_sims"
+
+    def half_widths() -> np.ndarray:
+        if len(batches) < 2:
+            return np.full(2, np.nan)
+        return z * np.sqrt(estimate_m2 / (len(batches) - 1) / len(batches))
+
+    while n_paths < max_sims:
+        n = min(batch_size, max_sims - n_paths)
+        chunks = process.iter_terminal_chunks(
+            process_selected, nPeriods, n, batch_size, n_paths
+        )
+        prices, likelihood_ratio = (np.concatenate(parts) for parts in zip(*chunks))
+        for batch in batch_digests(
+            last_price - prices,
+            batch_size=n,
+            weights=likelihood_ratio if process.importance_sampling is not None else None,
+            controls=prices,
+            control_mean=control_mean,
+        ):
+            batches.append(batch)
+            digest.merge(batch)
+            estimate = np.array(
+                [batch.quantile(confidence), batch.expected_shortfall(confidence)]
+            )
+            delta = estimate - estimate_mean
+            estimate_mean += delta / len(batches)
+            estimate_m2 += delta * (estimate - estimate_mean)
+        n_paths += n
+
+        if len(batches) >= min_batches:
+            var = digest.quantile(confidence)
+            es = digest.expected_shortfall(confidence)
+            var_half_width, es_half_width = half_widths()
+            if var_half_width <= rel_tol * abs(var) and es_half_width <= rel_tol * abs(es):
+                stop_reason = "tolerance"
+                break
+        if time_budget is not None and time.perf_counter() - started >= time_budget:
+            stop_reason = "time_budget"
+            break
+
+    var = float(digest.quantile(confidence))
+    es = float(digest.expected_shortfall(confidence))
+    var_half_width, es_half_width = (float(width) for width in half_widths())
+    return AdaptiveVaRResult(
+        process=process_selected.upper(),
+        confidence=confidence,
+        var=var,
+        es=es,
+        var_half_width=var_half_width,
+        es_half_width=es_half_width,
+        n_paths=n_paths,
+        n_batches=len(batches),
+        elapsed=time.perf_counter() - started,
+        converged=stop_reason == "tolerance",
+        stop_reason=stop_reason,
+        digest=digest,
+        batches=batches,
+    )
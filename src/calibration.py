@@ -0,0 +1,258 @@
+import hashlib
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from scipy.optimize import minimize
+from scipy.signal import lfilter
+from typing import Callable, Hashable, Union
+from src.cache import LRUCache
+
+# Returns further than this many standard deviations from zero are jumps
+JUMP_THRESHOLD = 2.5
+
+
+@dataclass(frozen=True)
+class GBMParams:
+    # Per bar drift and volatility of the log returns
+    mu: float
+    sigma: float
+
+
+@dataclass(frozen=True)
+class JDPParams:
+    # Annualised diffusion drift/volatility and jump intensity, with the
+    # per jump log size distribution N(jump_mean, jump_std^2)
+    mu: float
+    sigma: float
+    lambda_jumps: float
+    jump_mean: float
+    jump_std: float
+
+
+@dataclass(frozen=True)
+class OUParams:
+    # Long run level, volatility and mean reversion speed of the log return
+    mu: float
+    sigma: float
+    theta: float
+
+
+@dataclass(frozen=True)
+class GARCHParams:
+    # Per bar GJR-GARCH(1,1) for r_t = mu + e_t,
+    #     h_t = omega + (alpha + gamma [e_{t-1} < 0]) e_{t-1}^2 + beta h_{t-1}
+    # with gamma = 0 the symmetric GARCH(1,1). variance is h for the first
+    # bar after the data.
+    mu: float
+    omega: float
+    alpha: float
+    gamma: float
+    beta: float
+    variance: float
+
+
+@dataclass(frozen=True)
+class HestonParams:
+    # Per bar Heston model: price drift mu, variance mean reversion speed
+    # kappa towards theta, vol of vol xi, price/variance correlation rho and
+    # the variance v0 at the last bar.
+    mu: float
+    kappa: float
+    theta: float
+    xi: float
+    rho: float
+    v0: float
+
+
+Params = Union[GBMParams, JDPParams, OUParams, GARCHParams, HestonParams]
+
+
+def data_fingerprint(close: pd.Series | np.ndarray, interval: int) -> str:
+    # Identifies a dataset by the bytes of its close series and bar interval
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(close, dtype=np.float64).tobytes())
+    digest.update(str(interval).encode())
+    return digest.hexdigest()
+
+
+def calibrate_gbm(log_returns: np.ndarray, dt: float) -> GBMParams:
+    return GBMParams(mu=np.mean(log_returns), sigma=np.std(log_returns, ddof=1))
+
+
+def calibrate_jdp(log_returns: np.ndarray, dt: float) -> JDPParams:
+    mu = np.mean(log_returns) / dt
+    var = np.var(log_returns, ddof=1) / dt
+
+    jump_indices = np.abs(log_returns) > JUMP_THRESHOLD * np.std(log_returns, ddof=1)
+    if np.sum(jump_indices) > 0:
+        jumps = log_returns[jump_indices]
+        jump_mean = np.mean(jumps)
+        jump_std = np.std(jumps, ddof=1) if jumps.size > 1 else np.nan
+        lambda_jumps = jumps.size / (log_returns.size * dt)
+
+        if np.sum(~jump_indices) > 0:
+            sigma = np.std(log_returns[~jump_indices]) / np.sqrt(dt)
+        else:
+            sigma = np.sqrt(var * 0.8)
+
+        mu = mu - lambda_jumps * (np.exp(jump_mean + jump_std**2 / 2) - 1)
+    else:
+        sigma = np.sqrt(var)
+        lambda_jumps = 0
+        jump_mean = 0
+        jump_std = 1
+    return JDPParams(mu, sigma, lambda_jumps, jump_mean, jump_std)
+
+
+def calibrate_ou(log_returns: np.ndarray, dt: float) -> OUParams:
+    x = log_returns[:-1]
+    y = log_returns[1:]
+    n = len(x)
+
+    sum_x = np.sum(x)
+    sum_y = np.sum(y)
+    sum_xy = np.dot(x, y)
+    sum_x2 = np.dot(x, x)
+
+    denominator = n * sum_x2 - sum_x**2
+    if abs(denominator) < 1e-10:
+        theta = 0.001
+        mu = np.mean(log_returns)
+        sigma = np.std(log_returns) / np.sqrt(dt)
+    else:
+        b = (n * sum_xy - sum_x * sum_y) / denominator
+        a = (sum_y - b * sum_x) / n
+
+        if b >= 1 or b <= 0:
+            theta = 0.001 / dt
+        else:
+            theta = -np.log(max(b, 1e-10)) / dt
+
+        if theta > 0:
+            mu = a / (1 - b)
+        else:
+            mu = np.mean(log_returns)
+
+        residuals = y - (a + b * x)
+        if theta > 1e-10:
+            theoretical_var = (1 - np.exp(-2 * theta * dt)) / (2 * theta)
+        else:
+            theoretical_var = dt
+        residual_var = np.var(residuals)
+        if theoretical_var > 0:
+            sigma = np.sqrt(residual_var / theoretical_var)
+        else:
+            sigma = np.std(residuals) / np.sqrt(dt)
+
+    return OUParams(mu, sigma, theta)
+
+
+def garch_variance(
+    residuals: np.ndarray, omega: float, alpha: float, gamma: float, beta: float
+) -> np.ndarray:
+    # Conditional variances h_0 .. h_T (one past the data) of the residuals,
+    # started at their sample variance. The recursion is a first order
+    # linear filter in h, so it runs through lfilter rather than a loop.
+    arch = (alpha + gamma * (residuals < 0)) * residuals**2
+    h0 = np.mean(residuals**2)
+    return np.r_[h0, lfilter([1.0], [1.0, -beta], omega + arch, zi=[beta * h0])[0]]
+
+
+def _garch_nll(x: np.ndarray, returns: np.ndarray) -> float:
+    mu, omega, alpha, gamma, beta = x
+    h = garch_variance(returns - mu, omega, alpha, gamma, beta)[:-1]
+    if np.any(h <= 0):
+        return np.inf
+    return 0.5 * np.sum(np.log(h) + (returns - mu) ** 2 / h)
+
+
+def calibrate_garch(log_returns: np.ndarray, dt: float, asymmetric: bool = True) -> GARCHParams:
+    # Gaussian quasi maximum likelihood. Returns are rescaled to unit variance
+    # first so the optimiser works on O(1) numbers whatever the bar size.
+    scale = float(np.std(log_returns))
+    if scale == 0:
+        return GARCHParams(np.mean(log_returns), 0.0, 0.0, 0.0, 0.0, 0.0)
+    y = log_returns / scale
+    gamma_max = 0.5 if asymmetric else 0.0
+    result = minimize(
+        _garch_nll,
+        x0=[np.mean(y), 0.1, 0.05, 0.05 if asymmetric else 0.0, 0.85],
+        args=(y,),
+        method="SLSQP",
+        bounds=[(None, None), (1e-6, None), (0.0, 1.0), (0.0, gamma_max), (0.0, 1.0)],
+        # Covariance stationarity: alpha + gamma / 2 + beta < 1
+        constraints=[{"type": "ineq", "fun": lambda x: 0.999 - x[2] - x[3] / 2 - x[4]}],
+    )
+    if not result.success:
+        # A failed fit would be cached as if it were one: fall back to
+        # constant variance, i.e. no volatility clustering
+        return GARCHParams(float(np.mean(log_returns)), scale**2, 0.0, 0.0, 0.0, scale**2)
+    mu, omega, alpha, gamma, beta = (float(x) for x in result.x)
+    variance = float(garch_variance(y - mu, omega, alpha, gamma, beta)[-1])
+    return GARCHParams(
+        mu=mu * scale,
+        omega=omega * scale**2,
+        alpha=alpha,
+        gamma=gamma,
+        beta=beta,
+        variance=variance * scale**2,
+    )
+
+
+def calibrate_heston(log_returns: np.ndarray, dt: float, max_lag: int = 20) -> HestonParams:
+    # Method of moments on per bar returns r_t ~ sqrt(v_t) Z_t:
+    #   theta  from the variance,
+    #   kappa  from the exponential decay of the autocorrelation of r^2,
+    #   xi     from the excess kurtosis, 3 xi^2 / (2 kappa theta),
+    #   rho    from the leverage covariance Cov(r_t, r_{t+1}^2) ~ rho xi theta,
+    #   v0     from an EWMA of r^2 with the fitted decay.
+    m = np.mean(log_returns)
+    residuals = log_returns - m
+    theta = np.var(residuals)
+    if theta == 0:
+        return HestonParams(m, 1.0, 0.0, 0.0, 0.0, 0.0)
+
+    squares = residuals**2
+    centred = squares - squares.mean()
+    lags = np.arange(1, min(max_lag, squares.size // 4) + 1)
+    acf = np.array([centred[:-k] @ centred[k:] for k in lags]) / (centred @ centred)
+    positive = acf > 0
+    if positive.sum() >= 3:
+        slope = np.polyfit(lags[positive], np.log(acf[positive]), 1)[0]
+        kappa = float(np.clip(-slope, 1e-3, 1.0))
+    else:
+        kappa = 0.1
+
+    excess_kurtosis = max(np.mean(squares**2) / theta**2 - 3, 0.0)
+    xi = np.sqrt(2 * kappa * theta * excess_kurtosis / 3)
+    xi = max(xi, 1e-3 * np.sqrt(theta))
+    rho = float(np.clip(np.mean(residuals[:-1] * centred[1:]) / (xi * theta), -0.99, 0.99))
+
+    decay = np.exp(-kappa)
+    v0 = lfilter([1 - decay], [1.0, -decay], squares, zi=[decay * theta])[0][-1]
+    return HestonParams(
+        mu=float(m + theta / 2),
+        kappa=kappa,
+        theta=float(theta),
+        xi=float(xi),
+        rho=rho,
+        v0=float(v0),
+    )
+
+
+class CalibrationCache(LRUCache):
+    # Bounded LRU of fitted parameters, keyed by (fingerprint, process), so
+    # repeated callbacks on the same data skip the fits. Shared by every
+    # Processes instance in the interpreter.
+
+    def __init__(self, maxsize: int = 64) -> None:
+        super().__init__(max_entries=maxsize)
+
+    def get(self, key: Hashable, fit: Callable[[], Params]) -> Params:
+        params = super().get(key)
+        if params is None:
+            params = self.put(key, fit())
+        return params
+
+
+calibration_cache = CalibrationCache()
@@ -1,6 +1,6 @@
-import pandas as pd
 from binance import Client
-import numpy as np
+from src.kline_store import klines_to_table
+from src.ohlc import ohlc_frame
 class HistoricalData:
     data = None
     intervals = {
@@ -15,39 +15,9 @@ class HistoricalData:
     def __init__(self, api_key: str, api_secret: str) -> None:
         self.client = Client(api_key, api_secret)
 
-    def getKline(self, symbol: str, interval: str):
+    def getKline(self, symbol: str, interval: str, price_dtype: str = "float64"):
         data = self.client.get_historical_klines(symbol, self.intervals[interval])
-        df = pd.DataFrame(
-            data,
-            columns=[
-                "opentime",
-                "open",
-                "high",
-                "low",
-                "close",
-                "volume",
-                "closetime",
-                "volume",
-                "ntrades",
-                "Taker buy base asset volume",
-                "Taker buy quote asset volume",
-                "Ignore",
-            ],
-        )
-        df["opentime"] = pd.to_datetime(df.opentime, unit="ms")
-        df["closetime"] = pd.to_datetime(df.closetime, unit="ms")
-        df["open"] = df.open.astype(float)
-        df["high"] = df.high.astype(float)
-        df["low"] = df.low.astype(float)
-        df["close"] = df.close.astype(float)
-        df["volume"] = df.volume.astype(float)
-        df["log_returns"] = np.log(df["close"]/df["close"].shift(1))
-        df = df.drop([
-            "ntrades",
-            "Taker buy base asset volume",
-            "Taker buy quote asset volume",
-            "Ignore",
-        ],axis = 1)
+        df = ohlc_frame(klines_to_table(data), price_dtype)
         self.data = df
         return df
 
@@ -0,0 +1,150 @@
+import os
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyarrow import feather
+from typing import List, Optional
+from src.ohlc import ohlc_frame
+
+# Binance kline row layout, stored as is with times in epoch milliseconds
+KLINE_SCHEMA = pa.schema(
+    [
+        ("opentime", pa.int64()),
+        ("open", pa.float64()),
+        ("high", pa.float64()),
+        ("low", pa.float64()),
+        ("close", pa.float64()),
+        ("volume", pa.float64()),
+        ("closetime", pa.int64()),
+        ("quote_volume", pa.float64()),
+        ("ntrades", pa.int64()),
+        ("taker_base_volume", pa.float64()),
+        ("taker_quote_volume", pa.float64()),
+    ]
+)
+
+
+def klines_to_table(rows: List[list]) -> pa.Table:
+    # Raw get_historical_klines rows (prices as strings, trailing "ignore"
+    # field) to a typed table
+    columns = list(zip(*rows)) if rows else [[] for _ in KLINE_SCHEMA]
+    return pa.table(
+        [
+            pa.array(np.asarray(values, dtype=field.type.to_pandas_dtype()), type=field.type)
+            for field, values in zip(KLINE_SCHEMA, columns)
+        ],
+        schema=KLINE_SCHEMA,
+    )
+
+
+def frame_to_klines(frame: pd.DataFrame) -> List[list]:
+    # OHLC frame (or a getKline-shaped CSV read by pandas) back to REST rows
+    opentime = pd.to_datetime(frame.opentime).to_numpy("datetime64[ms]").astype(np.int64)
+    closetime = pd.to_datetime(frame.closetime).to_numpy("datetime64[ms]").astype(np.int64)
+    zeros = np.zeros(len(frame))
+    columns = [
+        opentime,
+        frame.open.to_numpy(np.float64),
+        frame.high.to_numpy(np.float64),
+        frame.low.to_numpy(np.float64),
+        frame.close.to_numpy(np.float64),
+        frame.volume.to_numpy(np.float64),
+        closetime,
+        # read_csv names getKline's second volume column "volume.1"
+        frame.get("quote_volume", frame.get("volume.1", pd.Series(zeros))).to_numpy(np.float64),
+        frame.get("ntrades", pd.Series(zeros)).to_numpy(np.int64),
+        zeros,
+        zeros,
+    ]
+    return [[*(value.item() for value in row), "0"] for row in zip(*columns)]
+
+
+class KlineStore:
+    # One uncompressed Feather (Arrow IPC) file per (symbol, interval).
+    # Loads memory-map the file; sync fetches only the bars that opened after
+    # the last stored closetime and swaps in the extended file atomically.
+
+    def __init__(self, root: str = os.path.join("data", "klines")) -> None:
+        self.root = root
+
+    def path(self, symbol: str, interval: str) -> str:
+        return os.path.join(self.root, f"{symbol}_{interval}.arrow")
+
+    def read_table(self, symbol: str, interval: str) -> Optional[pa.Table]:
+        path = self.path(symbol, interval)
+        if not os.path.exists(path):
+            return None
+        return feather.read_table(path, memory_map=True)
+
+    def last_closetime(self, symbol: str, interval: str) -> Optional[int]:
+        path = self.path(symbol, interval)
+        if not os.path.exists(path):
+            return None
+        closetime = feather.read_table(path, columns=["closetime"], memory_map=True)
+        return closetime.column(0)[-1].as_py() if closetime.num_rows else None
+
+    def append(self, symbol: str, interval: str, new: pa.Table) -> pa.Table:
+        existing = self.read_table(symbol, interval)
+        if existing is not None:
+            new = pa.concat_tables([existing, new])
+        os.makedirs(self.root, exist_ok=True)
+        path = self.path(symbol, interval)
+        tmp = f"{path}.tmp"
+        feather.write_feather(new, tmp, compression="uncompressed")
+        os.replace(tmp, path)
+        return new
+
+    def sync(self, client, symbol: str, interval: str) -> pa.Table:
+        # client is anything with binance.Client's get_historical_klines
+        last = self.last_closetime(symbol, interval)
+        rows = client.get_historical_klines(
+            symbol, interval, start_str=0 if last is None else last + 1
+        )
+        # The bar still forming has a closetime in the future; leave it for
+        # the next sync rather than freezing a partial bar into the store
+        now = int(time.time() * 1000)
+        rows = [row for row in rows if row[6] < now]
+        if rows:
+            return self.append(symbol, interval, klines_to_table(rows))
+        table = self.read_table(symbol, interval)
+        return klines_to_table([]) if table is None else table
+
+    def load(
+        self, symbol: str, interval: str, client=None, price_dtype: str = "float64"
+    ) -> pd.DataFrame:
+        table = (
+            self.sync(client, symbol, interval)
+            if client is not None
+            else self.read_table(symbol, interval)
+        )
+        if table is None:
+            raise FileNotFoundError(f"No stored klines for {symbol} {interval}")
+        return ohlc_frame(table, price_dtype)
+
+
+class LocalKlineClient:
+    # Offline stand-in for binance.Client serving klines from a frame shaped
+    # like getKline's output (e.g. test_data.csv). Only the first `visible`
+    # bars exist until advance() releases more, which mimics new bars
+    # closing on the exchange.
+
+    def __init__(self, frame: pd.DataFrame, visible: Optional[int] = None) -> None:
+        self._rows = frame_to_klines(frame)
+        self._opentimes = np.array([row[0] for row in self._rows], dtype=np.int64)
+        self.visible = len(self._rows) if visible is None else visible
+        self.requests = 0
+
+    def advance(self, n: int = 1) -> int:
+        self.visible = min(self.visible + n, len(self._rows))
+        return self.visible
+
+    def get_historical_klines(
+        self, symbol: str, interval: str, start_str=None, end_str=None, limit: int = 1000
+    ) -> List[list]:
+        self.requests += 1
+        first = 0 if start_str is None else int(np.searchsorted(self._opentimes, int(start_str)))
+        last = self.visible
+        if end_str is not None:
+            last = min(last, int(np.searchsorted(self._opentimes, int(end_str), side="right")))
+        return self._rows[first:last]
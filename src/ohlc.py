@@ -0,0 +1,91 @@
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyarrow import csv, feather, parquet
+from typing import List, Tuple
+
+OHLC_TIME_COLUMNS = ("opentime", "closetime")
+OHLC_VALUE_COLUMNS = ("open", "high", "low", "close", "volume", "quote_volume")
+OHLC_COLUMNS = ("opentime", "open", "high", "low", "close", "volume", "closetime", "quote_volume")
+
+
+def ohlc_schema(price_dtype: str = "float64") -> pa.Schema:
+    # Epoch millisecond times and float64 (or float32) prices and volumes.
+    # log_returns is not stored; it is always recomputed in float64.
+    price_type = pa.float32() if price_dtype == "float32" else pa.float64()
+    return pa.schema(
+        [
+            (name, pa.int64() if name in OHLC_TIME_COLUMNS else price_type)
+            for name in OHLC_COLUMNS
+        ]
+    )
+
+
+def _csv_column_names(path: str) -> List[str]:
+    # getKline's CSVs carry two "volume" columns; the second is the quote
+    # asset volume
+    with open(path) as f:
+        names = f.readline().strip().split(",")
+    seen = set()
+    for i, name in enumerate(names):
+        if name in seen and name == "volume":
+            names[i] = "quote_volume"
+        seen.add(names[i])
+    return names
+
+
+def _read_table(path: str) -> pa.Table:
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".parquet":
+        return parquet.read_table(path, memory_map=True)
+    if extension in (".arrow", ".feather"):
+        return feather.read_table(path, memory_map=True)
+    names = _csv_column_names(path)
+    wanted = [name for name in OHLC_COLUMNS if name in names]
+    return csv.read_csv(
+        path,
+        read_options=csv.ReadOptions(column_names=names, skip_rows=1),
+        convert_options=csv.ConvertOptions(
+            include_columns=wanted,
+            column_types={
+                name: pa.timestamp("ms") if name in OHLC_TIME_COLUMNS else pa.float64()
+                for name in wanted
+            },
+        ),
+    )
+
+
+def ohlc_frame(table: pa.Table, price_dtype: str = "float64") -> pd.DataFrame:
+    # Typed OHLC frame with datetime64[ms] times and a float64 log_returns
+    # column computed once here
+    schema = ohlc_schema(price_dtype)
+    columns = {}
+    for field in schema:
+        if field.name not in table.column_names:
+            continue
+        column = table.column(field.name)
+        if pa.types.is_timestamp(column.type):
+            column = column.cast(pa.int64())
+        columns[field.name] = column.cast(field.type)
+    df = pa.table(columns).to_pandas()
+    for name in OHLC_TIME_COLUMNS:
+        if name in df:
+            df[name] = df[name].to_numpy().view("datetime64[ms]")
+    close = df["close"].to_numpy(np.float64)
+    log_returns = np.empty_like(close)
+    log_returns[:1] = np.nan
+    np.log(close[1:] / close[:-1], out=log_returns[1:])
+    df["log_returns"] = log_returns
+    return df
+
+
+def read_ohlc(path: str, price_dtype: str = "float64") -> pd.DataFrame:
+    # CSV, Parquet or Feather through pyarrow; binary formats are memory-mapped
+    return ohlc_frame(_read_table(path), price_dtype)
+
+
+def price_views(df: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    # close and log_returns as numpy arrays, views of the frame's own
+    # buffers whenever pandas holds them as plain float columns
+    return df["close"].to_numpy(), df["log_returns"].to_numpy(np.float64)
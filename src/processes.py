@@ -1,31 +1,346 @@
 import pandas as pd
 import numpy as np
-from typing import Optional, Tuple
+import os
+import weakref
+import zlib
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from scipy.signal import lfilter
+from scipy.special import ndtr
+from scipy.stats import norm
 from src.util import dt_date_range
 import asyncio
 from src.util import dollar_format
+from src.risk_metrics import LossDigest, PathMetrics
+from src.calibration import (
+    GARCHParams,
+    GBMParams,
+    HestonParams,
+    JDPParams,
+    OUParams,
+    Params,
+    calibrate_garch,
+    calibrate_gbm,
+    calibrate_heston,
+    calibrate_jdp,
+    calibrate_ou,
+    calibration_cache,
+    data_fingerprint,
+)
+from src.registry import PROCESS_REGISTRY, get_engine, register_process
+from src.sampling import sobol_normals
+from src.ohlc import price_views
+from src.simulation import SimulationResult
+
+BIT_GENERATORS = {
+    "PCG64": np.random.PCG64,
+    "PCG64DXSM": np.random.PCG64DXSM,
+    "Philox": np.random.Philox,
+    "SFC64": np.random.SFC64,
+}
+
+# Paths are drawn in blocks of STREAM_BLOCK simulations, each block from its
+# own child of the seed. Chunks and workers are whole numbers of blocks, so
+# results do not depend on how the simulations are split up.
+STREAM_BLOCK = 4096
+
+VARIANCE_REDUCTION = ("antithetic", "moment_matching", "control_variate")
+
+# "pseudo" draws plain normals; "sobol" makes every stream block an
+# independently scrambled Sobol replicate built through a Brownian bridge.
+SAMPLERS = ("pseudo", "sobol")
+
+# Floating point types the shocks and price paths can be simulated in.
+# float32 halves the memory and bandwidth of a run; sums over periods,
+# likelihood ratios and terminal values are still taken in float64.
+DTYPES = ("float32", "float64")
+
+# Elements per block when float32 log returns are summed down the time axis
+# in float64, bounding the float64 scratch space
+ACCUMULATE_BLOCK = 1 << 20
+
+# Andersen's switching level between the quadratic and exponential branches
+QE_PSI_CRITICAL = 1.5
+
+EXECUTORS = {
+    "thread": ThreadPoolExecutor,
+    "process": ProcessPoolExecutor,
+}
 
 class Processes:
-    complete_gbm = None
-    complete_jdp = None
-    complete_ou = None
-    def __init__(self, returns: pd.DataFrame, seed: Optional[int] = None) -> None:
+    def __init__(
+        self,
+        returns: pd.DataFrame,
+        seed: Optional[int] = None,
+        chunk_size: int = 4 * STREAM_BLOCK,
+        bit_generator: str = "PCG64",
+        executor: str | Executor = "thread",
+        n_workers: Optional[int] = None,
+        variance_reduction: Iterable[str] = (),
+        sampler: str = "pseudo",
+        importance_sampling: Optional[float] = None,
+        dtype: str = "float64",
+        memoise: bool = True,
+    ) -> None:
         self.returns = returns
-        if seed is not None:
-            np.random.seed(seed)
-        self.interval = (
-            self.returns.closetime.iloc[1] - self.returns.closetime.iloc[0]
-        ).seconds
+        self.dtype = np.dtype(dtype)
+        if self.dtype.name not in DTYPES:
+            raise ValueError(f"Unsupported dtype: {dtype}")
+        self.variance_reduction = tuple(variance_reduction)
+        for technique in self.variance_reduction:
+            if technique not in VARIANCE_REDUCTION:
+                raise ValueError(f"Unknown variance reduction technique: {technique}")
+        if sampler not in SAMPLERS:
+            raise ValueError(f"Unknown sampler: {sampler}")
+        if sampler == "sobol" and "antithetic" in self.variance_reduction:
+            raise ValueError("Antithetic shocks cannot be combined with Sobol points")
+        self.sampler = sampler
+        # Loss confidence level to centre the price shocks on,
+        # e.g. 0.999; paths then carry likelihood ratios as weights.
+        if importance_sampling is not None and not 0.5 < importance_sampling < 1:
+            raise ValueError("importance_sampling must be a confidence level in (0.5, 1)")
+        if importance_sampling is not None and "control_variate" in self.variance_reduction:
+            # Control-variate weights are fitted against E[S_T] under the
+            # real measure, not the tilted one the paths are drawn from
+            raise ValueError("Importance sampling cannot be combined with a control variate")
+        self.importance_sampling = importance_sampling
+        self.chunk_size = chunk_size
+        # "thread", "process", "inline" or an Executor owned by the caller
+        self.executor = executor
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.seed_sequence = np.random.SeedSequence(seed)
+        self.bit_generator = BIT_GENERATORS[bit_generator]
+        # Whole seconds per bar; timedelta.seconds would wrap at one day
+        self.interval = int(
+            (self.returns.closetime.iloc[1] - self.returns.closetime.iloc[0]).total_seconds()
+        )
         self.dt = self.interval / (
             3600 * 24 * 252
         )  # Convert seconds to days assuming 252 trading days in a year
+        # Everything the engines need from the frame, read once. Parameters
+        # are fitted lazily per process and shared through the calibration
+        # cache by every instance built on the same data.
+        self.close, log_returns = price_views(self.returns)
+        finite = np.isfinite(log_returns)
+        self.log_returns = log_returns if finite.all() else log_returns[finite]
+        self.fingerprint = data_fingerprint(self.close, self.interval)
+        self.last_price = float(self.close[-1])
+        self.last_log_return = float(log_returns[-1])
+        self._params = {}
+        # Latest simulation per engine with its (nPeriods, nSims). Without
+        # memoise the results are only weakly referenced, so a cache owning
+        # them (DataManager's ResultCache) is what keeps them alive and its
+        # byte bound covers them.
+        self.memoise = memoise
+        self._simulations: Dict[str, Tuple[Tuple[int, int], SimulationResult]] = {}
+
+    def params(self, process_selected: str) -> Params:
+        process_selected = process_selected.upper()
+        if process_selected not in self._params:
+            self._params[process_selected] = calibration_cache.get(
+                (self.fingerprint, process_selected),
+                lambda: get_engine(process_selected).calibrate(self.log_returns, self.dt),
+            )
+        return self._params[process_selected]
+
+    def __getstate__(self) -> dict:
+        # Only what a worker needs to simulate a slice
+        state = self.__dict__.copy()
+        for key in ("executor", "_simulations"):
+            state.pop(key, None)
+        return state
+
+    def _rng(self, process_selected: str, block: int) -> np.random.Generator:
+        # Child of the root seed at spawn key (process, block)
+        seed = np.random.SeedSequence(
+            self.seed_sequence.entropy,
+            spawn_key=self.seed_sequence.spawn_key
+            + (zlib.crc32(process_selected.upper().encode()), block),
+        )
+        return np.random.Generator(self.bit_generator(seed))
+
+    def _draw(
+        self,
+        process_selected: str,
+        sampler: Callable[[int, int, np.random.Generator], np.ndarray],
+        nPeriods: int,
+        nSims: int,
+        start: int = 0,
+    ) -> np.ndarray:
+        # Simulations start .. start + nSims, block by block. start must sit on
+        # a block boundary.
+        blocks = [
+            sampler(
+                nPeriods,
+                min(STREAM_BLOCK, start + nSims - first),
+                self._rng(process_selected, first // STREAM_BLOCK),
+            )
+            for first in range(start, start + nSims, STREAM_BLOCK)
+        ]
+        if len(blocks) == 1:
+            return blocks[0]
+        if isinstance(blocks[0], tuple):
+            return tuple(np.hstack(parts) for parts in zip(*blocks))
+        return np.hstack(blocks)
+
+    def _normals(
+        self, nPeriods: int, nSims: int, rng: np.random.Generator
+    ) -> np.ndarray:
+        # Standard normal shocks with the opt-in variance reduction applied.
+        # Antithetic pairs sit in adjacent columns (2k, 2k + 1), so any even
+        # sized batch of simulations holds whole pairs.
+        if self.sampler == "sobol":
+            shocks = sobol_normals(nPeriods, nSims, rng).astype(self.dtype, copy=False)
+        elif "antithetic" in self.variance_reduction:
+            half = rng.standard_normal((nPeriods, (nSims + 1) // 2), dtype=self.dtype)
+            shocks = np.empty((nPeriods, nSims), dtype=self.dtype)
+            shocks[:, 0::2] = half
+            shocks[:, 1::2] = -half[:, : nSims // 2]
+        else:
+            shocks = rng.standard_normal((nPeriods, nSims), dtype=self.dtype)
+        if "moment_matching" in self.variance_reduction and nSims > 1:
+            shocks -= shocks.mean(axis=1, keepdims=True, dtype=np.float64)
+            shocks /= shocks.std(axis=1, keepdims=True, dtype=np.float64)
+        return shocks
+
+    def _tilted_normals(
+        self,
+        nPeriods: int,
+        nSims: int,
+        rng: np.random.Generator,
+        horizon: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # Diffusion shocks and the per path likelihood ratio dP/dQ. Under
+        # importance sampling every step's shock is shifted down so the sum
+        # over the horizon (nPeriods unless the shocks are drawn a few
+        # periods at a time) sits at the target loss quantile.
+        shocks = self._normals(nPeriods, nSims, rng)
+        if self.importance_sampling is None:
+            return shocks, np.ones(nSims)
+        shift = -norm.ppf(self.importance_sampling) / np.sqrt(horizon or nPeriods)
+        shocks += shift
+        return shocks, np.exp(
+            -shift * shocks.sum(axis=0, dtype=np.float64) + nPeriods * shift**2 / 2
+        )
 
-    def _gbm(self, nPeriods: int, nSims: int) -> pd.DataFrame:
-        mu = self.returns.log_returns.mean()
-        sigma = self.returns.log_returns.std()
+    def _horizon_normals(
+        self, steps: np.ndarray, nSims: int, rng: np.random.Generator
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # One standard normal per horizon standing in for the steps[k] period
+        # shocks between horizons k - 1 and k, and the likelihood ratio of the
+        # same importance tilt _tilted_normals applies period by period
+        shocks = self._normals(len(steps), nSims, rng)
+        if self.importance_sampling is None:
+            return shocks, np.ones(nSims)
+        shift = -norm.ppf(self.importance_sampling) / np.sqrt(steps.sum())
+        shocks += shift * np.sqrt(steps)[:, np.newaxis]
+        return shocks, np.exp(
+            -shift * (np.sqrt(steps) @ shocks) + steps.sum() * shift**2 / 2
+        )
+
+    def _cumulative_log_returns(
+        self, log_returns: np.ndarray, out: np.ndarray, carry: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        # Running sums of log returns down the time axis into out, continuing
+        # from the float64 totals in carry, and the totals after the last
+        # row. float32 returns are summed a block of rows at a time in
+        # float64 with the totals carried between blocks, so rounding does
+        # not grow with the horizon and no float64 copy of the paths is made.
+        if self.dtype == np.float64:
+            np.cumsum(log_returns, axis=0, out=out)
+            if carry is not None:
+                out += carry
+            return out[-1].copy()
+        nSims = log_returns.shape[1]
+        rows = max(1, ACCUMULATE_BLOCK // max(nSims, 1))
+        total = np.zeros(nSims) if carry is None else carry
+        for t in range(0, len(log_returns), rows):
+            block = np.cumsum(log_returns[t : t + rows], axis=0, dtype=np.float64)
+            block += total
+            out[t : t + rows] = block
+            total = block[-1]
+        return total
+
+    def _chunks(
+        self, nSims: int, chunk_size: Optional[int] = None, start: int = 0
+    ) -> Iterator[Tuple[int, int]]:
+        chunk_size = chunk_size or self.chunk_size
+        chunk_size = max(STREAM_BLOCK, chunk_size - chunk_size % STREAM_BLOCK)
+        for first in range(start, start + nSims, chunk_size):
+            yield first, min(chunk_size, start + nSims - first)
+
+    def batch_size(self, nSims: int) -> Optional[int]:
+        # Batch length for batch-means errors. Stream blocks are independent
+        # replicates, so use them whenever there are enough; Sobol points only
+        # are independent across blocks.
+        if self.sampler == "sobol" or nSims >= 10 * STREAM_BLOCK:
+            return STREAM_BLOCK
+        return None
+
+    def _worker_slices(self, nSims: int) -> List[Tuple[int, int]]:
+        blocks = -(-nSims // STREAM_BLOCK)
+        per_worker = -(-blocks // self.n_workers) * STREAM_BLOCK
+        return [
+            (start, min(per_worker, nSims - start))
+            for start in range(0, nSims, per_worker)
+        ]
+
+    @contextmanager
+    def _executor(self) -> Iterator[Optional[Executor]]:
+        if isinstance(self.executor, Executor):
+            yield self.executor
+        elif self.executor == "inline":
+            yield None
+        else:
+            with EXECUTORS[self.executor](max_workers=self.n_workers) as pool:
+                yield pool
+
+    def _map_slices(self, fn: Callable, nSims: int, *args) -> list:
+        # fn(*args, n, start) for each worker slice, results in slice order
+        with self._executor() as pool:
+            if pool is None:
+                return [fn(*args, n, start) for start, n in self._worker_slices(nSims)]
+            futures = [
+                pool.submit(fn, *args, n, start)
+                for start, n in self._worker_slices(nSims)
+            ]
+            return [future.result() for future in futures]
+
+    async def _gather_slices(
+        self, pool: Optional[Executor], fn: Callable, nSims: int, *args
+    ) -> list:
+        if pool is None:
+            return [fn(*args, n, start) for start, n in self._worker_slices(nSims)]
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(
+            *(
+                loop.run_in_executor(pool, fn, *args, n, start)
+                for start, n in self._worker_slices(nSims)
+            )
+        )
 
-        dW = np.random.normal(0, np.sqrt(self.dt), size=(nPeriods, nSims))
-        log_returns = (mu - (sigma**2) / 2) * self.dt + sigma * dW
+    def _gbm_stepper(
+        self, nPeriods: int, nSims: int, rng: np.random.Generator
+    ) -> Callable[[int], Tuple[np.ndarray, np.ndarray]]:
+        # Coefficients as Python floats so they keep float32 shocks float32
+        mu, sigma = float(self.params("GBM").mu), float(self.params("GBM").sigma)
+        sqrt_dt = float(np.sqrt(self.dt))
+
+        def step(k: int) -> Tuple[np.ndarray, np.ndarray]:
+            shocks, likelihood_ratio = self._tilted_normals(k, nSims, rng, nPeriods)
+            dW = sqrt_dt * shocks
+            return (mu - (sigma**2) / 2) * self.dt + sigma * dW, likelihood_ratio
+
+        return step
+
+    def _gbm_increments(
+        self, nPeriods: int, nSims: int, rng: np.random.Generator
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        return self._gbm_stepper(nPeriods, nSims, rng)(nPeriods)
+
+    def _gbm(self, nPeriods: int, nSims: int) -> pd.DataFrame:
+        log_returns, _ = self._draw("GBM", self._gbm_increments, nPeriods, nSims)
         time_index = [
             t
             for t in dt_date_range(
@@ -43,277 +358,624 @@ class Processes:
     def gbm_log_returns(self, nPeriods: int, nSims: int) -> pd.DataFrame:
         return self._gbm(nPeriods, nSims)
 
-    def gbm_price_path(self, nPeriods: int, nSims: int) -> pd.DataFrame:
-        log_returns = self._gbm(nPeriods, nSims)
-        price_paths = self.returns.close.iloc[-1] * np.exp(log_returns.cumsum())
-        initial_row = pd.DataFrame(
-            [self.returns.close.iloc[-1]] * len(price_paths.columns),
-            index=price_paths.columns,
-        ).T
-        initial_row.index = [self.returns.closetime.iloc[-1]]
-        return pd.concat([initial_row, price_paths])
-
-    def jdp(self, nPeriods: int, nSims: int) -> pd.DataFrame:
-        mu = self.returns.log_returns.mean() / self.dt
-        var = self.returns.log_returns.var() / self.dt
-
-        jump_indices = (
-            np.abs(self.returns.log_returns) > 2.5 * self.returns.log_returns.std()
+    def _increment_prices(
+        self,
+        process_selected: str,
+        sampler: Callable[[int, int, np.random.Generator], Tuple[np.ndarray, np.ndarray]],
+        nPeriods: int,
+        nSims: int,
+        start: int = 0,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        log_returns, likelihood_ratio = self._draw(
+            process_selected, sampler, nPeriods, nSims, start
         )
-        if np.sum(jump_indices) > 0:
-            jump_mean = self.returns.log_returns[jump_indices].mean()
-            jump_std = self.returns.log_returns[jump_indices].std()
-            lambda_jumps = len(self.returns.log_returns[jump_indices]) / (
-                len(self.returns.log_returns) * self.dt
-            )
-
-            if len(self.returns.log_returns[~jump_indices]) > 0:
-                sigma = np.std(self.returns.log_returns[~jump_indices]) / np.sqrt(
-                    self.dt
-                )
-            else:
-                sigma = np.sqrt(var * 0.8)
-
-            mu = mu - lambda_jumps * (np.exp(jump_mean + jump_std**2 / 2) - 1)
-        else:
-            sigma = np.sqrt(var)
-            lambda_jumps = 0
-            jump_mean = 0
-            jump_std = 1
-
-        time_index = [
-            t
-            for t in dt_date_range(
-                self.returns.closetime.iloc[-1].to_pydatetime(),
-                self.interval,
-                nPeriods + 1,
-            )
-        ]
-
-        dW = np.random.normal(0, np.sqrt(self.dt), size=(nPeriods, nSims))
-        jump_component = np.zeros((nPeriods, nSims))
-        if lambda_jumps > 0:
-            jump_prob = lambda_jumps * self.dt
-            if jump_prob <= 0.1:
-                jump_occurs = np.random.random((nPeriods, nSims)) < jump_prob
-                jump_magnitude = np.random.normal(
-                    jump_mean, jump_std, size=(nPeriods, nSims)
+        prices = np.empty((nPeriods + 1, nSims), dtype=self.dtype)
+        prices[0, :] = self.last_price
+        self._cumulative_log_returns(log_returns, prices[1:])
+        np.exp(prices[1:], out=prices[1:])
+        prices[1:] *= self.last_price
+        return prices, likelihood_ratio
+
+    def _gbm_exact(
+        self, horizons: np.ndarray, nSims: int, start: int = 0
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # log S_t / S_0 is N((mu - sigma^2 / 2) t, sigma^2 t), so each horizon
+        # is one Gaussian step on from the one before
+        params: GBMParams = self.params("GBM")
+        steps = np.diff(horizons, prepend=0)
+        shocks, likelihood_ratio = self._draw(
+            "GBM",
+            lambda _, n, rng: self._horizon_normals(steps, n, rng),
+            len(steps),
+            nSims,
+            start,
+        )
+        tau = (steps * self.dt)[:, np.newaxis]
+        increments = (params.mu - params.sigma**2 / 2) * tau + params.sigma * np.sqrt(tau) * shocks
+        return np.cumsum(increments, axis=0), likelihood_ratio
+
+    def gbm_price_path(self, nPeriods: int, nSims: int) -> SimulationResult:
+        return self.simulate("GBM", nPeriods, nSims)
+
+    def _jdp_stepper(
+        self, nPeriods: int, nSims: int, rng: np.random.Generator
+    ) -> Callable[[int], Tuple[np.ndarray, np.ndarray]]:
+        params: JDPParams = self.params("JDP")
+        mu, sigma = float(params.mu), float(params.sigma)
+        lambda_jumps, jump_mean, jump_std = params.lambda_jumps, params.jump_mean, params.jump_std
+        sqrt_dt = float(np.sqrt(self.dt))
+
+        def step(k: int) -> Tuple[np.ndarray, np.ndarray]:
+            shocks, likelihood_ratio = self._tilted_normals(k, nSims, rng, nPeriods)
+            dW = sqrt_dt * shocks
+            log_returns = (mu - (sigma**2) / 2) * self.dt + sigma * dW
+            if lambda_jumps > 0:
+                # The sum of N iid N(jump_mean, jump_std^2) jumps is exactly
+                # N(N * jump_mean, N * jump_std^2), so draw the Poisson count
+                # per cell and one normal for each cell that actually jumped.
+                n_jumps = rng.poisson(lambda_jumps * self.dt, size=(k, nSims))
+                jumped = np.nonzero(n_jumps)
+                counts = n_jumps[jumped]
+                log_returns[jumped] += counts * jump_mean + np.sqrt(counts) * jump_std * (
+                    rng.standard_normal(counts.size)
                 )
-                jump_component = jump_occurs * jump_magnitude
-            else:
-                n_jumps = np.random.poisson(jump_prob, size=(nPeriods, nSims))
-                max_jumps = int(np.max(n_jumps) if np.any(n_jumps > 0) else 0)
-                if max_jumps > 0:
-                    jump_magnitudes = np.random.normal(
-                        jump_mean, jump_std, size=(max_jumps, nSims, max_jumps)
-                    )
-                    jump_indices = np.arange(max_jumps)[None, None, :]
-                    jump_mask = jump_indices < n_jumps[:, :, None]
-                    jump_component = np.sum(
-                        jump_mask * jump_magnitudes[None, :, :], axis=2
-                    )
-        log_returns = (mu - (sigma**2) / 2) * self.dt + sigma * dW + jump_component
-        prices = np.zeros((nPeriods + 1, nSims))
-        prices[0, :] = self.returns.close.iloc[-1]
-
-        cumulative_log_returns = np.exp(np.cumsum(log_returns, axis=0))
-        prices[1:, :] = prices[0, :] * cumulative_log_returns
-        df = pd.DataFrame(
-            prices, index=time_index, columns=[f"sim_{i + 1}" for i in range(nSims)]
+            return log_returns, likelihood_ratio
+
+        return step
+
+    def _jdp_increments(
+        self, nPeriods: int, nSims: int, rng: np.random.Generator
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        return self._jdp_stepper(nPeriods, nSims, rng)(nPeriods)
+
+    def jdp(self, nPeriods: int, nSims: int) -> SimulationResult:
+        return self.simulate("JDP", nPeriods, nSims)
+
+    def _simulation_result(
+        self,
+        process_selected: str,
+        prices: np.ndarray,
+        likelihood_ratio: np.ndarray,
+        periods: Optional[np.ndarray] = None,
+    ) -> SimulationResult:
+        # Importance-sampled paths carry their likelihood ratios as weights;
+        # equally weighted paths carry none
+        return SimulationResult.from_paths(
+            process_selected,
+            prices,
+            self.returns.closetime.iloc[-1],
+            self.interval,
+            self.params(process_selected),
+            likelihood_ratio if self.importance_sampling is not None else None,
+            self.fingerprint,
+            periods,
         )
-        return df
+
     #############################
     # Broken need to fix
-    def _ou_fit(self) -> Tuple[float, float, float]:
-        log_returns = self.returns.log_returns.to_numpy()
-
-        x = log_returns[:-1]
-        y = log_returns[1:]
-        n = len(x)
-
-        sum_x = np.sum(x)
-        sum_y = np.sum(y)
-        sum_xy = np.dot(x, y)
-        sum_x2 = np.dot(x, x)
-
-        denominator = n * sum_x2 - sum_x**2
-        if abs(denominator) < 1e-10:
-            theta = 0.001
-            mu = np.mean(log_returns)
-            sigma = np.std(log_returns) / np.sqrt(self.dt)
-        else:
-            b = (n * sum_xy - sum_x * sum_y) / denominator
-            a = (sum_y - b * sum_x) / n
-
-            if b >= 1 or b<= 0:
-                theta = 0.001 / self.dt
-                
-            else:
-                theta = -np.log(max(b, 1e-10)) / self.dt
-                # theta = min(theta, .001 / self.dt)
-
-            if theta > 0:
-                mu = a / (1 - b)
-            else:
-                mu = np.mean(log_returns)
-
-            residuals = y - (a + b * x)
-            if theta > 1e-10:
-                theoretical_var = (1 - np.exp(-2 * theta * self.dt)) / (2 * theta)
-            else:
-                theoretical_var = self.dt
-            residual_var = np.var(residuals)
-            if theoretical_var > 0:
-                sigma = np.sqrt(residual_var / theoretical_var)
-            else:
-                sigma = np.std(residuals) / np.sqrt(self.dt)
-        
-
-        return (mu, sigma, theta)
-
-    def ou(self, nPeriods: int, nSims: int) -> pd.DataFrame:
-        mu, sigma, theta = self._ou_fit()
-        timesteps = np.arange(1, nPeriods + 1)
-
-        exp_neg_theta_dt = np.exp(-theta * self.dt)
-        
+    def ou(self, nPeriods: int, nSims: int) -> SimulationResult:
+        return self.simulate("OU", nPeriods, nSims)
+
+    def _ou_exact(
+        self, horizons: np.ndarray, nSims: int, start: int = 0
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # X_T - X_0 of the OU log return level at each horizon from the exact
+        # Gaussian transition between consecutive horizons, which is all the
+        # price path needs there.
+        params: OUParams = self.params("OU")
+        mu, sigma, theta = params.mu, params.sigma, params.theta
+        steps = np.diff(horizons, prepend=0)
+        tau = (steps * self.dt)[:, np.newaxis]
+        random_shocks = self._draw(
+            "OU", lambda _, n, rng: self._normals(len(steps), n, rng), len(steps), nSims, start
+        )
         if theta < 1e-10:
-            # Brownian motion case
-            std_increment = sigma * np.sqrt(self.dt)
-            random_increments = np.random.normal(0, 1, size=(nPeriods, nSims))
-            cumulative_increments = np.cumsum(random_increments, axis=0)
-            
-            # Generate future log return levels
-            time_steps_col = timesteps[:, np.newaxis]
-            log_returns = (
-                self.returns.log_returns.iloc[-1]
-                + mu * time_steps_col * self.dt
-                + std_increment * cumulative_increments
-            )
-        else:
-            # Full OU process
-            std_next = np.sqrt(
-                (sigma**2) * (1 - np.exp(-2 * theta * self.dt)) / (2 * theta)
-            )
-            random_shocks = np.random.normal(0, 1, size=(nPeriods, nSims))
-            
-            # Create coefficient matrix for noise contributions
-            i_matrix, j_matrix = np.meshgrid(
-                timesteps, np.arange(nPeriods), indexing="ij"
-            )
-            coefficient_matrix = np.where(
-                j_matrix <= i_matrix - 1,
-                exp_neg_theta_dt ** (i_matrix - j_matrix - 1),
-                0.0,
-            )
-            noise_contributions = coefficient_matrix @ random_shocks
-
-            # Calculate deterministic component
-            time_steps_col = timesteps[:, np.newaxis]
-            deterministic_part = mu + (
-                self.returns.log_returns.iloc[-1] - mu
-            ) * (exp_neg_theta_dt ** time_steps_col)
+            return np.cumsum(mu * tau + sigma * np.sqrt(tau) * random_shocks, axis=0), np.ones(nSims)
+
+        decay = np.exp(-theta * tau)
+        std = np.sqrt((sigma**2) * (1 - decay**2) / (2 * theta))
+        levels = np.empty((len(steps), nSims))
+        level = np.full(nSims, self.last_log_return)
+        for k in range(len(steps)):
+            level = mu + (level - mu) * decay[k] + std[k] * random_shocks[k]
+            levels[k] = level
+        return levels - self.last_log_return, np.ones(nSims)
+
+    def _ou_stepper(
+        self, nPeriods: int, nSims: int, rng: np.random.Generator
+    ) -> Callable[[int], Tuple[np.ndarray, np.ndarray]]:
+        # Changes of the OU log return level a few periods at a time, the
+        # level carried from one call to the next through lfilter's state.
+        # The level stays float64 whatever the dtype, as e^{-theta dt} is
+        # too close to one for float32; only the changes are narrowed.
+        params: OUParams = self.params("OU")
+        mu, sigma, theta = params.mu, params.sigma, params.theta
+        exp_neg_theta_dt = np.exp(-theta * self.dt)
+        std_next = np.sqrt((sigma**2) * (1 - np.exp(-2 * theta * self.dt)) / (2 * max(theta, 1e-10)))
+        level = np.full(nSims, self.last_log_return)
+
+        def step(k: int) -> Tuple[np.ndarray, np.ndarray]:
+            nonlocal level
+            random_shocks = self._normals(k, nSims, rng)
+            if theta < 1e-10:
+                increments = mu * self.dt + sigma * np.sqrt(self.dt) * random_shocks
+                return increments.astype(self.dtype, copy=False), np.ones(nSims)
+            levels = mu + lfilter(
+                [std_next],
+                [1.0, -exp_neg_theta_dt],
+                random_shocks,
+                axis=0,
+                zi=(exp_neg_theta_dt * (level - mu))[np.newaxis],
+            )[0]
+            increments = np.diff(levels, axis=0, prepend=level[np.newaxis])
+            level = levels[-1]
+            return increments.astype(self.dtype, copy=False), np.ones(nSims)
+
+        return step
+
+    def _ou_increments(
+        self, nPeriods: int, nSims: int, rng: np.random.Generator
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        return self._ou_stepper(nPeriods, nSims, rng)(nPeriods)
+    #############################
 
-            # Combine deterministic and stochastic parts
-            log_returns = deterministic_part + std_next * noise_contributions
-        
-        # Create complete log return series including initial value
-        all_log_returns = np.vstack([
-            np.full((1, nSims), self.returns.log_returns.iloc[-1]),
-            log_returns
-        ])
-        
-        # Calculate log return increments (period-to-period changes)
-        log_return_increments = np.diff(all_log_returns, axis=0)
-        
-        # For the first period, use the simulated log return as the increment
-        # (this represents the change from the last historical return to first simulated return)
-        first_period_increments = log_returns[0, :] - self.returns.log_returns.iloc[-1]
-        
-        # Combine all increments
-        all_increments = np.vstack([
-            first_period_increments.reshape(1, -1),
-            log_return_increments[1:, :]  # Skip the first diff since we handled it above
-        ])
-        
-        # Convert to price multipliers and calculate cumulative product
-        price_multipliers = np.exp(all_increments)
-        
-        # Calculate price paths starting from last historical price
-        initial_prices = np.full((1, nSims), self.returns.close.iloc[-1])
-        price_changes = initial_prices * np.cumprod(price_multipliers, axis=0)
-        
-        # Combine initial price with simulated prices
-        price_paths = np.vstack([
-            initial_prices,
-            price_changes
-        ])
-        
-        # Create DataFrame with proper date index
-        df = pd.DataFrame(
-            price_paths, 
-            index=[
-                t for t in dt_date_range(
-                    self.returns.closetime.iloc[-1].to_pydatetime(),
-                    self.interval,
-                    nPeriods + 1
+    def _garch_stepper(
+        self, nPeriods: int, nSims: int, rng: np.random.Generator
+    ) -> Callable[[int], Tuple[np.ndarray, np.ndarray]]:
+        # Per bar log returns, stepping the conditional variance of every
+        # simulation at once. Only the time loop is in Python; the variance
+        # carries over from one call to the next.
+        params: GARCHParams = self.params("GARCH")
+        variance = np.full(nSims, params.variance, dtype=self.dtype)
+
+        def step(k: int) -> Tuple[np.ndarray, np.ndarray]:
+            nonlocal variance
+            shocks, likelihood_ratio = self._tilted_normals(k, nSims, rng, nPeriods)
+            log_returns = np.empty((k, nSims), dtype=self.dtype)
+            for t in range(k):
+                residuals = np.sqrt(variance) * shocks[t]
+                log_returns[t] = params.mu + residuals
+                negative = (residuals < 0).astype(self.dtype)
+                variance = (
+                    params.omega
+                    + (params.alpha + params.gamma * negative) * residuals**2
+                    + params.beta * variance
+                )
+            return log_returns, likelihood_ratio
+
+        return step
+
+    def _garch_increments(
+        self, nPeriods: int, nSims: int, rng: np.random.Generator
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        return self._garch_stepper(nPeriods, nSims, rng)(nPeriods)
+
+    def garch(self, nPeriods: int, nSims: int) -> SimulationResult:
+        return self.simulate("GARCH", nPeriods, nSims)
+
+    def _heston_stepper(
+        self, nPeriods: int, nSims: int, rng: np.random.Generator
+    ) -> Callable[[int], Tuple[np.ndarray, np.ndarray]]:
+        # Andersen's quadratic-exponential scheme with one bar steps. The
+        # variance step matches the exact conditional mean and variance of
+        # v(t + 1); its uniform for the exponential branch comes from a normal
+        # through the CDF, so every shock goes through the shared samplers.
+        # The log price uses the central (gamma1 = gamma2 = 1/2) integrated
+        # variance approximation, which carries the price/variance correlation.
+        params: HestonParams = self.params("HESTON")
+        kappa, theta, xi, rho = params.kappa, params.theta, params.xi, params.rho
+
+        decay = float(np.exp(-kappa))
+        if xi > 0:
+            k0 = -rho * kappa * theta / xi
+            k1 = 0.5 * (kappa * rho / xi - 0.5) - rho / xi
+            k2 = 0.5 * (kappa * rho / xi - 0.5) + rho / xi
+        else:
+            # Deterministic variance (e.g. a flat close series): v(t + 1) is
+            # its conditional mean and there is no correlation term
+            k0, k1, k2 = 0.0, -0.25, -0.25
+        k3 = 0.5 * (1 - rho**2)
+        variance = np.full(nSims, params.v0, dtype=self.dtype)
+
+        def step(k: int) -> Tuple[np.ndarray, np.ndarray]:
+            nonlocal variance
+            variance_shocks = self._normals(k, nSims, rng)
+            shocks, likelihood_ratio = self._tilted_normals(k, nSims, rng, nPeriods)
+            log_returns = np.empty((k, nSims), dtype=self.dtype)
+            for t in range(k):
+                m = theta + (variance - theta) * decay
+                if xi == 0:
+                    next_variance = m
+                else:
+                    s2 = variance * xi**2 * decay * (1 - decay) / kappa + theta * xi**2 * (
+                        1 - decay
+                    ) ** 2 / (2 * kappa)
+                    psi = s2 / m**2
+
+                    # Both branches on every path, with psi clipped into each one's
+                    # domain, is cheaper than masked gathers and scatters
+                    inv_psi = 2 / np.minimum(psi, QE_PSI_CRITICAL)
+                    b2 = inv_psi - 1 + np.sqrt(inv_psi * (inv_psi - 1))
+                    quadratic = m / (1 + b2) * (np.sqrt(b2) + variance_shocks[t]) ** 2
+                    p = (np.maximum(psi, 1) - 1) / (np.maximum(psi, 1) + 1)
+                    tail = ndtr(-variance_shocks[t])  # 1 - u
+                    with np.errstate(divide="ignore"):
+                        exponential = np.where(
+                            tail >= 1 - p, 0.0, np.log((1 - p) / tail) * m / (1 - p)
+                        )
+                    next_variance = np.where(psi <= QE_PSI_CRITICAL, quadratic, exponential)
+
+                log_returns[t] = (
+                    params.mu
+                    + k0
+                    + k1 * variance
+                    + k2 * next_variance
+                    + np.sqrt(k3 * (variance + next_variance)) * shocks[t]
                 )
-            ],
-            columns=[f"sim_{i + 1}" for i in range(nSims)]
+                variance = next_variance
+            return log_returns, likelihood_ratio
+
+        return step
+
+    def _heston_increments(
+        self, nPeriods: int, nSims: int, rng: np.random.Generator
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        return self._heston_stepper(nPeriods, nSims, rng)(nPeriods)
+
+    def heston(self, nPeriods: int, nSims: int) -> SimulationResult:
+        return self.simulate("HESTON", nPeriods, nSims)
+
+    def price_paths(
+        self, process_selected: str, nPeriods: int, nSims: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # (nPeriods + 1) x nSims price array and per path likelihood ratios,
+        # simulations split across workers. Parameters are fitted first so
+        # they travel with the instance to any worker.
+        self.params(process_selected)
+        slices = self._map_slices(self._simulate_paths, nSims, process_selected, nPeriods)
+        return tuple(np.hstack(parts) for parts in zip(*slices))
+
+    def _simulate_paths(
+        self, process_selected: str, nPeriods: int, nSims: int, start: int = 0
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        return get_engine(process_selected).simulate_paths(self, nPeriods, nSims, start)
+
+    def simulate_horizons(
+        self, process_selected: str, horizons: Iterable[int], nSims: int
+    ) -> SimulationResult:
+        # Prices at several horizons (in periods) of the same paths, drawn
+        # straight from the engine's transition law when it has one, in
+        # O(len(horizons) * nSims) rather than stepping every period. Row 0
+        # is the last observed price.
+        horizons = np.unique(np.asarray(list(horizons), dtype=np.int64))
+        if horizons.size == 0 or horizons[0] < 1:
+            raise ValueError("horizons must be positive numbers of periods")
+        self.params(process_selected)
+        slices = self._map_slices(self._horizon_slice, nSims, process_selected, horizons)
+        log_returns, likelihood_ratio = (np.hstack(parts) for parts in zip(*slices))
+        prices = np.empty((horizons.size + 1, nSims), dtype=self.dtype)
+        prices[0] = self.last_price
+        np.exp(log_returns, out=prices[1:])
+        prices[1:] *= self.last_price
+        return self._simulation_result(
+            process_selected, prices, likelihood_ratio, np.r_[0, horizons]
         )
-        return df
-    #############################
 
-    async def compare_processes(self, nPeriods: int, nSims: int) -> pd.DataFrame:
-
-
-        async def run_gbm():
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, self.gbm_price_path, nPeriods, nSims)
-        async def run_jdp():
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None,self.jdp, nPeriods, nSims)
-        async def run_ou():
-            loop = asyncio.get_event_loop()
-            return await loop.run_in_executor(None, self.ou, nPeriods, nSims)
-        
-        gbm_res, jdp_res, ou_res = await asyncio.gather(run_gbm(), run_jdp(), run_ou())
+    def _horizon_slice(
+        self, process_selected: str, horizons: np.ndarray, nSims: int, start: int = 0
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        return get_engine(process_selected).simulate_horizons(self, horizons, nSims, start)
+
+    def _simulate_terminal(
+        self, process_selected: str, nPeriods: int, nSims: int, start: int = 0
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        return get_engine(process_selected).simulate_terminal(self, nPeriods, nSims, start)
+
+    def simulate(self, process_selected: str, nPeriods: int, nSims: int) -> SimulationResult:
+        # Price paths of one engine, memoised until they are asked for with
+        # a different horizon or path count
+        name = process_selected.upper()
+        result = self._memoised(name, (nPeriods, nSims))
+        if result is None:
+            result = get_engine(name).to_result(self, *self.price_paths(name, nPeriods, nSims))
+            self._memoise(name, (nPeriods, nSims), result)
+        return result
+
+    def _memoised(
+        self, name: str, size: Optional[Tuple[int, int]] = None
+    ) -> Optional[SimulationResult]:
+        cached = self._simulations.get(name)
+        if cached is None or (size is not None and cached[0] != size):
+            return None
+        return cached[1] if self.memoise else cached[1]()
+
+    def _memoise(self, name: str, size: Tuple[int, int], result: SimulationResult) -> None:
+        self._simulations[name] = (size, result if self.memoise else weakref.ref(result))
+
+    def control_mean(self, process_selected: str, nPeriods: int) -> Optional[float]:
+        # Known E[S_T] used as a control variate for the terminal price
+        # distribution; None when the option is off or the engine has no
+        # closed form.
+        engine = get_engine(process_selected)
+        if "control_variate" not in self.variance_reduction or engine.control_mean is None:
+            return None
+        return engine.control_mean(self, nPeriods)
+
+    def _gbm_control_mean(self, nPeriods: int) -> float:
+        mu = self.params("GBM").mu
+        return self.last_price * np.exp(mu * self.dt * nPeriods)
+
+    def _jdp_control_mean(self, nPeriods: int) -> float:
+        params: JDPParams = self.params("JDP")
+        compensator = params.lambda_jumps * (
+            np.exp(params.jump_mean + params.jump_std**2 / 2) - 1
+        )
+        return self.last_price * np.exp((params.mu + compensator) * self.dt * nPeriods)
 
-        self.complete_gbm = gbm_res
-        self.complete_jdp = jdp_res
-        self.complete_ou = ou_res
+    def _summed_increments(
+        self, process_selected: str, sampler: Callable, nPeriods: int, nSims: int, start: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        log_returns, likelihood_ratio = self._draw(
+            process_selected, sampler, nPeriods, nSims, start
+        )
+        return log_returns.sum(axis=0, dtype=np.float64), likelihood_ratio
+
+    def iter_terminal_chunks(
+        self,
+        process_selected: str,
+        nPeriods: int,
+        nSims: int,
+        chunk_size: Optional[int] = None,
+        start: int = 0,
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        # Terminal prices (and likelihood ratios) only, simulated chunk_size
+        # paths at a time so peak memory scales with nPeriods * chunk_size
+        # rather than nPeriods * nSims. Terminal log returns are float64 sums
+        # whatever the dtype, and stay float64: losses S_0 - S_T are small
+        # differences of large prices.
+        engine = get_engine(process_selected)
+        last_price = self.last_price
+        for first, n in self._chunks(nSims, chunk_size, start):
+            log_returns, likelihood_ratio = engine.simulate_terminal(self, nPeriods, n, first)
+            yield last_price * np.exp(log_returns), likelihood_ratio
+
+    def iter_price_windows(
+        self,
+        process_selected: str,
+        nPeriods: int,
+        nSims: int,
+        window: int = 64,
+        start: int = 0,
+    ) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        # Prices of simulations start .. start + nSims over periods 1 to
+        # nPeriods, `window` periods (rows) at a time, with the likelihood
+        # ratios of the paths so far. Each stream block's stepper carries its
+        # paths between windows, so only one window is ever held.
+        engine = get_engine(process_selected)
+        if engine.stepper is None:
+            raise ValueError(f"Process {process_selected} cannot be simulated a window at a time")
+        if self.sampler == "sobol":
+            raise ValueError("Sobol points span the whole horizon; use the pseudo sampler")
+        steps = [
+            engine.stepper(
+                self,
+                nPeriods,
+                min(STREAM_BLOCK, start + nSims - first),
+                self._rng(process_selected, first // STREAM_BLOCK),
+            )
+            for first in range(start, start + nSims, STREAM_BLOCK)
+        ]
+        cumulative = np.zeros(nSims)
+        likelihood_ratio = np.ones(nSims)
+        for t in range(0, nPeriods, window):
+            k = min(window, nPeriods - t)
+            log_returns, ratios = (np.hstack(parts) for parts in zip(*(step(k) for step in steps)))
+            likelihood_ratio = likelihood_ratio * ratios
+            prices = np.empty((k, nSims), dtype=self.dtype)
+            cumulative = self._cumulative_log_returns(log_returns, prices, cumulative)
+            np.exp(prices, out=prices)
+            prices *= self.last_price
+            yield prices, likelihood_ratio
+
+    def _metrics_slice(
+        self,
+        process_selected: str,
+        nPeriods: int,
+        barrier: Optional[float],
+        window: int,
+        chunk_size: Optional[int],
+        nSims: int,
+        start: int,
+    ) -> PathMetrics:
+        metrics = None
+        for first, n in self._chunks(nSims, chunk_size, start):
+            chunk = PathMetrics(self.last_price, n, barrier, self.dtype)
+            for prices, likelihood_ratio in self.iter_price_windows(
+                process_selected, nPeriods, n, window, first
+            ):
+                chunk.update(prices)
+            if self.importance_sampling is not None:
+                chunk.weights = likelihood_ratio
+            metrics = chunk if metrics is None else metrics.merge(chunk)
+        return metrics
+
+    def path_metrics(
+        self,
+        process_selected: str,
+        nPeriods: int,
+        nSims: int,
+        barrier: Optional[float] = None,
+        window: int = 64,
+        chunk_size: Optional[int] = None,
+    ) -> PathMetrics:
+        # Max drawdown, barrier first passage and time under water of every
+        # path, accumulated as the paths are simulated. Each worker holds
+        # window x chunk_size prices at a time plus O(nSims) running state,
+        # whatever the horizon.
+        self.params(process_selected)
+        parts = self._map_slices(
+            self._metrics_slice, nSims, process_selected, nPeriods, barrier, window, chunk_size
+        )
+        for part in parts[1:]:
+            parts[0].merge(part)
+        return parts[0]
+
+    def _terminal_slice(
+        self,
+        process_selected: str,
+        nPeriods: int,
+        chunk_size: Optional[int],
+        nSims: int,
+        start: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        chunks = self.iter_terminal_chunks(process_selected, nPeriods, nSims, chunk_size, start)
+        return tuple(np.concatenate(parts) for parts in zip(*chunks))
+
+    def _digest_slice(
+        self,
+        process_selected: str,
+        nPeriods: int,
+        chunk_size: Optional[int],
+        nSims: int,
+        start: int,
+    ) -> LossDigest:
+        digest = LossDigest()
+        last_price = self.last_price
+        for chunk, likelihood_ratio in self.iter_terminal_chunks(
+            process_selected, nPeriods, nSims, chunk_size, start
+        ):
+            digest.update(last_price - chunk, likelihood_ratio)
+        return digest
+
+    def terminal_sample(
+        self,
+        process_selected: str,
+        nPeriods: int,
+        nSims: int,
+        chunk_size: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # Terminal prices and their likelihood ratio weights
+        self.params(process_selected)
+        slices = self._map_slices(
+            self._terminal_slice, nSims, process_selected, nPeriods, chunk_size
+        )
+        return tuple(np.concatenate(parts) for parts in zip(*slices))
+
+    def terminal_prices(
+        self,
+        process_selected: str,
+        nPeriods: int,
+        nSims: int,
+        chunk_size: Optional[int] = None,
+    ) -> np.ndarray:
+        return self.terminal_sample(process_selected, nPeriods, nSims, chunk_size)[0]
+
+    def terminal_var(
+        self,
+        process_selected: str,
+        nPeriods: int,
+        nSims: int,
+        chunk_size: Optional[int] = None,
+    ) -> LossDigest:
+        self.params(process_selected)
+        digests = self._map_slices(self._digest_slice, nSims, process_selected, nPeriods, chunk_size)
+        for digest in digests[1:]:
+            digests[0].merge(digest)
+        return digests[0]
+
+    async def simulate_all(
+        self, nPeriods: int, nSims: int, processes: Optional[Iterable[str]] = None
+    ) -> Dict[str, SimulationResult]:
+        # Price paths of the requested engines (all registered ones by
+        # default). Engines already simulated at this size are not rerun; the
+        # rest share one pool.
+        names = [name.upper() for name in (processes or PROCESS_REGISTRY)]
+        simulations = {name: self._memoised(name, (nPeriods, nSims)) for name in names}
+        pending = [name for name in names if simulations[name] is None]
+        for name in pending:
+            self.params(name)
+
+        with self._executor() as pool:
+            results = await asyncio.gather(
+                *(
+                    self._gather_slices(pool, self._simulate_paths, nSims, name, nPeriods)
+                    for name in pending
+                )
+            )
+        for name, slices in zip(pending, results):
+            simulations[name] = get_engine(name).to_result(
+                self, *(np.hstack(parts) for parts in zip(*slices))
+            )
+            self._memoise(name, (nPeriods, nSims), simulations[name])
+        return simulations
 
-        gbm_final = gbm_res.iloc[-1]
-        jdp_final = jdp_res.iloc[-1]
-        ou_res = ou_res.iloc[-1]
+    async def compare_processes(
+        self, nPeriods: int, nSims: int, processes: Optional[Iterable[str]] = None
+    ) -> pd.DataFrame:
+        return self.comparison_table(await self.simulate_all(nPeriods, nSims, processes))
 
+    @classmethod
+    def comparison_table(cls, simulations: Dict[str, SimulationResult]) -> pd.DataFrame:
+        # Final price stats, one column per engine
         v_dollar_format = np.vectorize(dollar_format)
-        data = [
-            ["Max", "Min", "Mean", "Std", "Variance"],
-
-        ]
 
         df = pd.DataFrame(
-            columns = ["GBM", "JDP", "OU"],
+            columns = list(simulations),
             index = np.array(["Max", "Min", "Mean", "Std", "Variance"]),
             data = v_dollar_format(np.array([
-                [max(gbm_final), min(gbm_final), np.mean(gbm_final), np.std(gbm_final), np.var(gbm_final)],
-                [max(jdp_final), min(jdp_final), np.mean(jdp_final), np.std(jdp_final), np.var(jdp_final)],
-                [max(ou_res), min(ou_res), np.mean(ou_res), np.std(ou_res), np.var(ou_res)],
+                cls._final_stats(result) for result in simulations.values()
             ]).T)
         ).reset_index(drop = False).rename(columns={"index" : "Stats"})
         
         return df
 
-    def str_select(self, process_selected : str) -> pd.DataFrame:
-        if process_selected.upper() == "GBM":
-            if self.complete_gbm is not None:
-                return self.complete_gbm
-        elif process_selected.upper() == "JDP":
-            if self.complete_jdp is not None:
-                return self.complete_jdp
-        elif process_selected.upper() == "OU":
-            if self.complete_ou is not None:
-                return self.complete_ou
-        else:
-            return pd.DataFrame()
\ No newline at end of file
+    @staticmethod
+    def _final_stats(result: SimulationResult) -> list:
+        # Max, min, mean, std and variance of the final prices, weighted by
+        # likelihood ratios when the paths were importance sampled
+        final = result.final.astype(np.float64, copy=False)
+        weights = result.weights
+        mean = np.average(final, weights=weights)
+        var = np.average((final - mean) ** 2, weights=weights)
+        return [final.max(), final.min(), mean, np.sqrt(var), var]
+
+    def str_select(self, process_selected : str) -> Optional[SimulationResult]:
+        # Latest simulation of an engine, None if it has not been run (or,
+        # without memoise, is no longer held anywhere else)
+        return self._memoised(process_selected.upper())
+
+
+register_process(
+    "GBM",
+    calibrate_gbm,
+    increments=Processes._gbm_increments,
+    stepper=Processes._gbm_stepper,
+    exact=Processes._gbm_exact,
+    control_mean=Processes._gbm_control_mean,
+)
+register_process(
+    "JDP",
+    calibrate_jdp,
+    increments=Processes._jdp_increments,
+    stepper=Processes._jdp_stepper,
+    control_mean=Processes._jdp_control_mean,
+)
+register_process(
+    "OU",
+    calibrate_ou,
+    increments=Processes._ou_increments,
+    exact=Processes._ou_exact,
+    stepper=Processes._ou_stepper,
+)
+register_process(
+    "GARCH",
+    calibrate_garch,
+    increments=Processes._garch_increments,
+    stepper=Processes._garch_stepper,
+)
+register_process(
+    "HESTON",
+    calibrate_heston,
+    increments=Processes._heston_increments,
+    stepper=Processes._heston_stepper,
+)
@@ -0,0 +1,109 @@
+import numpy as np
+from dataclasses import dataclass
+from functools import partial
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    from src.processes import Processes
+    from src.calibration import Params
+    from src.simulation import SimulationResult
+
+Sample = Tuple[np.ndarray, np.ndarray]
+
+
+@dataclass(frozen=True)
+class ProcessEngine:
+    # A named price process. Every callable takes the Processes instance
+    # first, which supplies the shocks, the fitted parameters (through
+    # Processes.params) and the last observed price.
+    #
+    #   calibrate(log_returns, dt)                    -> parameters
+    #   increments(sim, nPeriods, nSims, rng)         -> per bar log returns, weights
+    #   paths(sim, nPeriods, nSims, start)            -> prices, weights
+    #   terminal(sim, nPeriods, nSims, start)         -> log return to horizon, weights
+    #   exact(sim, horizons, nSims, start)            -> log returns to each horizon, weights
+    #   stepper(sim, nPeriods, nSims, rng)            -> step(k) -> next k log returns, weights
+    #   control_mean(sim, nPeriods)                   -> E[S_T]
+    #
+    # An engine needs calibrate and either increments or paths; the rest
+    # default to what can be built from those. exact samples the process at
+    # the given increasing horizons (in periods) straight from its transition
+    # law, one draw per horizon rather than per period, and then also serves
+    # terminal samples. stepper resumes one stream block's paths k periods
+    # per call, carrying its own state, so paths can be consumed a window at
+    # a time; the weights of successive calls multiply.
+    name: str
+    calibrate: Callable[[np.ndarray, float], "Params"]
+    increments: Optional[Callable[..., Sample]] = None
+    paths: Optional[Callable[..., Sample]] = None
+    terminal: Optional[Callable[..., Sample]] = None
+    exact: Optional[Callable[..., Sample]] = None
+    stepper: Optional[Callable[..., Callable[[int], Sample]]] = None
+    control_mean: Optional[Callable[["Processes", int], float]] = None
+
+    def simulate_paths(
+        self, sim: "Processes", nPeriods: int, nSims: int, start: int = 0
+    ) -> Sample:
+        if self.paths is not None:
+            return self.paths(sim, nPeriods, nSims, start)
+        return sim._increment_prices(
+            self.name, partial(self.increments, sim), nPeriods, nSims, start
+        )
+
+    def simulate_terminal(
+        self, sim: "Processes", nPeriods: int, nSims: int, start: int = 0
+    ) -> Sample:
+        if self.terminal is not None:
+            return self.terminal(sim, nPeriods, nSims, start)
+        if self.exact is not None:
+            log_returns, weights = self.exact(sim, np.array([nPeriods]), nSims, start)
+            return log_returns[-1], weights
+        if self.increments is not None:
+            return sim._summed_increments(
+                self.name, partial(self.increments, sim), nPeriods, nSims, start
+            )
+        prices, weights = self.simulate_paths(sim, nPeriods, nSims, start)
+        return np.log(prices[-1] / prices[0]), weights
+
+    def simulate_horizons(
+        self, sim: "Processes", horizons: np.ndarray, nSims: int, start: int = 0
+    ) -> Sample:
+        if self.exact is not None:
+            return self.exact(sim, horizons, nSims, start)
+        prices, weights = self.simulate_paths(sim, int(horizons[-1]), nSims, start)
+        return np.log(prices[horizons] / prices[0]), weights
+
+    def to_result(
+        self, sim: "Processes", prices: np.ndarray, weights: Optional[np.ndarray] = None
+    ) -> "SimulationResult":
+        return sim._simulation_result(self.name, prices, weights)
+
+
+PROCESS_REGISTRY: Dict[str, ProcessEngine] = {}
+
+
+def register_process(
+    name: str,
+    calibrate: Callable[[np.ndarray, float], "Params"],
+    increments: Optional[Callable[..., Sample]] = None,
+    paths: Optional[Callable[..., Sample]] = None,
+    terminal: Optional[Callable[..., Sample]] = None,
+    exact: Optional[Callable[..., Sample]] = None,
+    stepper: Optional[Callable[..., Callable[[int], Sample]]] = None,
+    control_mean: Optional[Callable[["Processes", int], float]] = None,
+) -> ProcessEngine:
+    # Names are case insensitive. Registering a name again replaces the engine.
+    if increments is None and paths is None:
+        raise ValueError(f"Process {name} needs increments or paths")
+    engine = ProcessEngine(
+        name.upper(), calibrate, increments, paths, terminal, exact, stepper, control_mean
+    )
+    PROCESS_REGISTRY[engine.name] = engine
+    return engine
+
+
+def get_engine(name: str) -> ProcessEngine:
+    try:
+        return PROCESS_REGISTRY[name.upper()]
+    except KeyError:
+        raise ValueError(f"Unknown process: {name}") from None
@@ -0,0 +1,61 @@
+import numpy as np
+import warnings
+from functools import lru_cache
+from typing import Tuple
+from scipy.stats import norm, qmc
+
+
+@lru_cache(maxsize=32)
+def _bridge_schedule(nPeriods: int) -> Tuple[np.ndarray, ...]:
+    # Fill order for a Brownian bridge on steps 1..nPeriods: the horizon first,
+    # then midpoints of ever finer intervals. Each entry conditions the target
+    # point on its already known left and right neighbours; the horizon is
+    # conditioned on W_0 = 0 alone.
+    target, left, right = [nPeriods], [0], [0]
+    w_left, w_right, std = [0.0], [0.0], [np.sqrt(nPeriods)]
+    intervals = [(0, nPeriods)]
+    while intervals:
+        next_intervals = []
+        for lo, hi in intervals:
+            if hi - lo < 2:
+                continue
+            mid = (lo + hi) // 2
+            target.append(mid)
+            left.append(lo)
+            right.append(hi)
+            w_left.append((hi - mid) / (hi - lo))
+            w_right.append((mid - lo) / (hi - lo))
+            std.append(np.sqrt((mid - lo) * (hi - mid) / (hi - lo)))
+            next_intervals += [(lo, mid), (mid, hi)]
+        intervals = next_intervals
+    return tuple(np.array(x) for x in (target, left, right, w_left, w_right, std))
+
+
+def brownian_bridge(normals: np.ndarray) -> np.ndarray:
+    # Turn (nPeriods, nSims) iid standard normals into unit-variance Brownian
+    # increments, with row 0 deciding the terminal value. Low-discrepancy
+    # points put their best-distributed coordinates where the variance is.
+    nPeriods = normals.shape[0]
+    target, left, right, w_left, w_right, std = _bridge_schedule(nPeriods)
+    path = np.zeros((nPeriods + 1,) + normals.shape[1:])
+    for i in range(nPeriods):
+        path[target[i]] = (
+            w_left[i] * path[left[i]] + w_right[i] * path[right[i]] + std[i] * normals[i]
+        )
+    return np.diff(path, axis=0)
+
+
+def sobol_normals(
+    nPeriods: int, nSims: int, rng: np.random.Generator
+) -> np.ndarray:
+    # One scrambled Sobol point set of nSims points in nPeriods dimensions,
+    # mapped through the inverse normal CDF and a Brownian bridge. Every call
+    # is an independent randomised replicate.
+    sobol = qmc.Sobol(d=nPeriods, scramble=True, rng=rng)
+    with warnings.catch_warnings():
+        # Partial replicates are not a power of two; they stay unbiased
+        warnings.simplefilter("ignore", UserWarning)
+        points = sobol.random(nSims)
+    eps = np.finfo(np.float64).eps
+    normals = norm.ppf(np.clip(points, eps, 1 - eps)).T
+    return brownian_bridge(normals)
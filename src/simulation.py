@@ -0,0 +1,133 @@
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass, field
+from typing import Optional, Sequence, Union
+from src.calibration import Params
+
+PathIds = Union[int, slice, Sequence[int], np.ndarray]
+
+
+@dataclass
+class SimulationResult:
+    # Price paths of one engine run kept as a single (nPeriods + 1) x nSims
+    # array, one column per path, with a datetime64 time axis starting at the
+    # last observed close. periods holds each row's offset in periods, which
+    # is every period for stepped paths and only the requested ones for
+    # horizon samples. Paths are identified by 1-based ids, as the
+    # sim_<id> columns of the frame view, which is only built on request.
+    # weights holds the likelihood ratios of importance-sampled paths, None
+    # when the paths are equally weighted.
+    process: str
+    prices: np.ndarray
+    times: np.ndarray
+    params: Optional[Params] = None
+    weights: Optional[np.ndarray] = None
+    fingerprint: Optional[str] = None
+    path_ids: Optional[np.ndarray] = None
+    periods: Optional[np.ndarray] = None
+    _frame: Optional[pd.DataFrame] = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        if self.path_ids is None:
+            self.path_ids = np.arange(1, self.prices.shape[1] + 1)
+        if self.periods is None:
+            self.periods = np.arange(self.prices.shape[0])
+
+    @classmethod
+    def from_paths(
+        cls,
+        process: str,
+        prices: np.ndarray,
+        start: pd.Timestamp,
+        interval: float,
+        params: Optional[Params] = None,
+        weights: Optional[np.ndarray] = None,
+        fingerprint: Optional[str] = None,
+        periods: Optional[np.ndarray] = None,
+    ) -> "SimulationResult":
+        # Time axis `interval` seconds per period from start, built in one step
+        if periods is None:
+            periods = np.arange(prices.shape[0])
+        step = np.timedelta64(int(round(interval * 1000)), "ms")
+        times = np.datetime64(start, "ms") + step * periods
+        return cls(
+            process, np.ascontiguousarray(prices), times, params, weights, fingerprint, None, periods
+        )
+
+    @property
+    def nPeriods(self) -> int:
+        return int(self.periods[-1])
+
+    @property
+    def nSims(self) -> int:
+        return self.prices.shape[1]
+
+    @property
+    def final(self) -> np.ndarray:
+        return self.prices[-1]
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self.prices, self.times, self.weights, self.path_ids, self.periods)
+        return sum(array.nbytes for array in arrays if array is not None)
+
+    def __len__(self) -> int:
+        # Rows of the frame view, as len() of the DataFrame it replaces
+        return self.prices.shape[0]
+
+    def _positions(self, ids: PathIds) -> Union[int, slice, np.ndarray]:
+        # Column positions of path ids. Slices stay slices, so selecting a
+        # range of paths is a view of prices rather than a copy.
+        if isinstance(ids, slice):
+            if ids.step not in (None, 1):
+                raise ValueError("Path id slices cannot have a step")
+            first = 0 if ids.start is None else np.searchsorted(self.path_ids, ids.start)
+            last = (
+                self.nSims if ids.stop is None else np.searchsorted(self.path_ids, ids.stop)
+            )
+            return slice(int(first), int(last))
+        scalar = np.ndim(ids) == 0
+        ids = np.atleast_1d(ids)
+        positions = np.searchsorted(self.path_ids, ids)
+        found = positions < self.nSims
+        found[found] = self.path_ids[positions[found]] == ids[found]
+        if not found.all():
+            raise KeyError(f"Unknown path ids: {ids[~found]}")
+        return int(positions[0]) if scalar else positions
+
+    def path(self, path_id: int) -> np.ndarray:
+        return self.prices[:, self._positions(path_id)]
+
+    def select(self, ids: PathIds) -> "SimulationResult":
+        # Subset of paths by id, sharing the time axis and metadata
+        positions = self._positions(ids)
+        if isinstance(positions, int):
+            positions = [positions]
+        return SimulationResult(
+            self.process,
+            self.prices[:, positions],
+            self.times,
+            self.params,
+            None if self.weights is None else self.weights[positions],
+            self.fingerprint,
+            self.path_ids[positions],
+            self.periods,
+        )
+
+    def __getitem__(self, ids: PathIds) -> "SimulationResult":
+        return self.select(ids)
+
+    def to_frame(self) -> pd.DataFrame:
+        # sim_<id> columns over a DatetimeIndex, built once and wrapping
+        # prices without a copy; importance weights ride along in attrs
+        if self._frame is None:
+            df = pd.DataFrame(
+                self.prices,
+                index=pd.DatetimeIndex(self.times),
+                columns=[f"sim_{i}" for i in self.path_ids],
+                copy=False,
+            )
+            if self.weights is not None:
+                df.attrs["likelihood_ratio"] = self.weights
+            self._frame = df
+        return self._frame
@@ -0,0 +1,328 @@
+import threading
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from typing import Callable, Dict, Iterable, List, Optional
+from src.calibration import JUMP_THRESHOLD
+from src.kline_store import KLINE_SCHEMA, frame_to_klines
+from src.ohlc import OHLC_COLUMNS, ohlc_frame
+
+
+class OnlineMoments:
+    # Count, mean and central moment sums M2..M4 of a sliding sample, updated
+    # one observation at a time with the single point Welford/Pebay
+    # recurrences in both directions, so a window costs O(1) per bar.
+
+    def __init__(self) -> None:
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.m3 = 0.0
+        self.m4 = 0.0
+
+    @classmethod
+    def from_array(cls, values: np.ndarray) -> "OnlineMoments":
+        moments = cls()
+        values = np.asarray(values, dtype=np.float64)
+        if values.size:
+            centred = values - values.mean()
+            moments.n = values.size
+            moments.mean = float(values.mean())
+            moments.m2 = float(centred @ centred)
+            moments.m3 = float(np.sum(centred**3))
+            moments.m4 = float(np.sum(centred**4))
+        return moments
+
+    def add(self, x: float) -> None:
+        n_a = self.n
+        self.n += 1
+        n = self.n
+        delta = x - self.mean
+        delta_n = delta / n
+        term = delta * delta_n * n_a
+        self.mean += delta_n
+        self.m4 += (
+            term * delta_n**2 * (n * n - 3 * n + 3)
+            + 6 * delta_n**2 * self.m2
+            - 4 * delta_n * self.m3
+        )
+        self.m3 += term * delta_n * (n - 2) - 3 * delta_n * self.m2
+        self.m2 += term
+
+    def remove(self, x: float) -> None:
+        # Inverse of add(x): solve the single point recurrences for the
+        # moments of the sample without x
+        n = self.n
+        if n <= 1:
+            self.__init__()
+            return
+        n_a = n - 1
+        mean_a = (n * self.mean - x) / n_a
+        delta = x - mean_a
+        m2_a = self.m2 - delta**2 * n_a / n
+        m3_a = self.m3 - delta**3 * n_a * (n_a - 1) / n**2 + 3 * delta * m2_a / n
+        m4_a = (
+            self.m4
+            - delta**4 * n_a * (n_a**2 - n_a + 1) / n**3
+            - 6 * delta**2 * m2_a / n**2
+            + 4 * delta * m3_a / n
+        )
+        self.n, self.mean, self.m2, self.m3, self.m4 = n_a, mean_a, m2_a, m3_a, m4_a
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.n - 1) if self.n > 1 else np.nan
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.variance))
+
+    @property
+    def skew(self) -> float:
+        # Population skewness, as scipy.stats.skew
+        return np.sqrt(self.n) * self.m3 / self.m2**1.5 if self.m2 > 0 else np.nan
+
+    @property
+    def kurtosis(self) -> float:
+        # Excess kurtosis, as scipy.stats.kurtosis
+        return self.n * self.m4 / self.m2**2 - 3 if self.m2 > 0 else np.nan
+
+
+class KlineRingBuffer:
+    # Fixed capacity window of bars in preallocated columns, with the log
+    # return of every bar against the one before it. append hands back the
+    # evicted bar's log return and jump flag so running stats can drop them.
+
+    def __init__(self, capacity: int = 1000) -> None:
+        self.capacity = capacity
+        self.columns = {
+            field.name: np.empty(capacity, dtype=field.type.to_pandas_dtype())
+            for field in KLINE_SCHEMA
+            if field.name in OHLC_COLUMNS
+        }
+        self.log_returns = np.full(capacity, np.nan)
+        self.jumps = np.zeros(capacity, dtype=bool)
+        self.size = 0
+        self._next = 0
+
+    def append(self, row: list, log_return: float, jump: bool) -> Optional[tuple]:
+        slot = self._next
+        evicted = (self.log_returns[slot], self.jumps[slot]) if self.size == self.capacity else None
+        for i, field in enumerate(KLINE_SCHEMA):
+            if field.name in self.columns:
+                self.columns[field.name][slot] = row[i]
+        self.log_returns[slot] = log_return
+        self.jumps[slot] = jump
+        self._next = (slot + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        return evicted
+
+    def _order(self) -> np.ndarray:
+        if self.size < self.capacity:
+            return np.arange(self.size)
+        return (self._next + np.arange(self.capacity)) % self.capacity
+
+    @property
+    def last_close(self) -> float:
+        return float(self.columns["close"][(self._next - 1) % self.capacity])
+
+    def ordered_log_returns(self) -> np.ndarray:
+        return self.log_returns[self._order()]
+
+    def frame(self) -> pd.DataFrame:
+        # Oldest to newest, typed like every other OHLC frame
+        order = self._order()
+        return ohlc_frame(pa.table({name: values[order] for name, values in self.columns.items()}))
+
+
+class LiveMarket:
+    # Streaming view of one symbol: a ring buffer of bars plus online
+    # moments and jump counts of its log returns. The moments at the last
+    # invalidation are kept as a reference; when any of them drifts past
+    # `drift_threshold` every listener gets the current window as a frame.
+    # Bar listeners get every closed bar's row, before any drift listener.
+
+    def __init__(self, capacity: int = 1000, drift_threshold: float = 0.1) -> None:
+        self.buffer = KlineRingBuffer(capacity)
+        self.moments = OnlineMoments()
+        self.jump_count = 0
+        self.drift_threshold = drift_threshold
+        self.listeners: List[Callable[[pd.DataFrame], None]] = []
+        self.bar_listeners: List[Callable[[list], None]] = []
+        self.bars = 0
+        self.invalidations = 0
+        self._reference: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def seed(self, history: pd.DataFrame | Iterable[list]) -> "LiveMarket":
+        # Warm start from an OHLC frame or REST rows without notifying anyone
+        if isinstance(history, pd.DataFrame):
+            history = frame_to_klines(history)
+        rows = list(history)[-self.buffer.capacity :]
+        closes = np.array([float(row[4]) for row in rows])
+        log_returns = np.r_[np.nan, np.log(closes[1:] / closes[:-1])]
+        finite = log_returns[np.isfinite(log_returns)]
+        self.moments = OnlineMoments.from_array(finite)
+        jumps = np.abs(log_returns) > JUMP_THRESHOLD * self.moments.std
+        for row, log_return, jump in zip(rows, log_returns, jumps):
+            self.buffer.append(row, log_return, bool(jump))
+        self.jump_count = int(jumps.sum())
+        self._reference = self.statistics()
+        return self
+
+    def statistics(self) -> Dict[str, float]:
+        return {
+            "mean": self.moments.mean,
+            "std": self.moments.std,
+            "skew": self.moments.skew,
+            "kurtosis": self.moments.kurtosis,
+            "jump_rate": self.jump_count / max(self.moments.n, 1),
+            "jumps": self.jump_count,
+        }
+
+    def drift(self) -> Dict[str, float]:
+        # Changes since the last invalidation: volatility and jump count
+        # relative (the latter smoothed by one jump), the mean in units of
+        # the reference volatility and kurtosis relative to 3 + excess
+        now, ref = self.statistics(), self._reference
+        if not ref or not np.isfinite(ref["std"]) or ref["std"] == 0:
+            return {"volatility": np.inf}
+        return {
+            "volatility": abs(now["std"] / ref["std"] - 1),
+            "mean": abs(now["mean"] - ref["mean"]) / ref["std"],
+            "kurtosis": abs((now["kurtosis"] + 3) / (ref["kurtosis"] + 3) - 1),
+            "jumps": abs((now["jumps"] + 1) / (ref["jumps"] + 1) - 1),
+        }
+
+    def on_kline(self, row: list) -> bool:
+        # Append one closed bar; True when it triggered an invalidation
+        with self._lock:
+            self.bars += 1
+            log_return = (
+                np.log(float(row[4]) / self.buffer.last_close) if self.buffer.size else np.nan
+            )
+            jump = bool(
+                np.isfinite(log_return)
+                and self.moments.n > 1
+                and abs(log_return) > JUMP_THRESHOLD * self.moments.std
+            )
+            evicted = self.buffer.append(row, log_return, jump)
+            if evicted is not None:
+                evicted_return, evicted_jump = evicted
+                if np.isfinite(evicted_return):
+                    self.moments.remove(float(evicted_return))
+                self.jump_count -= int(evicted_jump)
+            if np.isfinite(log_return):
+                self.moments.add(float(log_return))
+            self.jump_count += int(jump)
+
+            drifted = max(self.drift().values()) > self.drift_threshold
+            if drifted:
+                self.invalidations += 1
+                self._reference = self.statistics()
+                frame = self.buffer.frame()
+        for listener in self.bar_listeners:
+            listener(row)
+        if drifted:
+            for listener in self.listeners:
+                listener(frame)
+        return drifted
+
+
+def _socket_row(kline: dict) -> list:
+    # Websocket kline payload to the REST row layout
+    return [
+        kline["t"], kline["o"], kline["h"], kline["l"], kline["c"], kline["v"],
+        kline["T"], kline["q"], kline["n"], kline["V"], kline["Q"], "0",
+    ]
+
+
+class BinanceKlineStream:
+    # Closed bars from Binance's kline websocket, as REST-style rows
+    def __init__(self, symbol: str, interval: str, api_key: str = "", api_secret: str = "") -> None:
+        self.symbol = symbol
+        self.interval = interval
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.callbacks: List[Callable[[list], object]] = []
+        self._manager = None
+
+    def subscribe(self, callback: Callable[[list], object]) -> None:
+        self.callbacks.append(callback)
+
+    def _handle(self, message: dict) -> None:
+        kline = message.get("k")
+        if kline is None or not kline["x"]:
+            return
+        row = _socket_row(kline)
+        for callback in self.callbacks:
+            callback(row)
+
+    def start(self) -> None:
+        from binance import ThreadedWebsocketManager
+
+        self._manager = ThreadedWebsocketManager(self.api_key, self.api_secret)
+        self._manager.start()
+        self._manager.start_kline_socket(
+            callback=self._handle, symbol=self.symbol, interval=self.interval
+        )
+
+    def stop(self) -> None:
+        if self._manager is not None:
+            self._manager.stop()
+            self._manager = None
+
+
+class ReplayKlineStream(BinanceKlineStream):
+    # Offline stand-in emitting recorded rows (e.g. from LocalKlineClient or
+    # a kline store) through the same subscribe/start/stop interface. start
+    # replays on a background thread; run replays on the caller's thread.
+    # With a speedup each bar is due (opentime - first opentime) / speedup
+    # after the replay started, so speedup=60 plays 1m bars once a second;
+    # without one bars are emitted back to back. `due` holds the
+    # perf_counter time the current bar was scheduled for, and callbacks
+    # slower than the schedule make later bars late rather than dropping them.
+
+    def __init__(
+        self,
+        rows: Iterable[list],
+        symbol: str = "",
+        interval: str = "",
+        speedup: Optional[float] = None,
+    ) -> None:
+        super().__init__(symbol, interval)
+        self.rows = list(rows)
+        self.speedup = speedup
+        self.due = None
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def run(self) -> int:
+        emitted = 0
+        started = time.perf_counter()
+        first = self.rows[0][0] if self.rows else 0
+        for row in self.rows:
+            if self.speedup:
+                self.due = started + (row[0] - first) / 1000 / self.speedup
+                if self._stopped.wait(max(self.due - time.perf_counter(), 0)):
+                    break
+            else:
+                self.due = time.perf_counter()
+            if self._stopped.is_set():
+                break
+            for callback in self.callbacks:
+                callback(row)
+            emitted += 1
+        return emitted
+
+    def start(self) -> None:
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -3,25 +3,132 @@ import numpy as np
 from plotly.subplots import make_subplots
 import plotly.graph_objects as go
 from src.util import dollar_format
+from src.risk_metrics import (
+    LossDigest,
+    batch_digests,
+    control_variate_weights,
+    iid_standard_error,
+    merge_digests,
+    slice_quantiles,
+    var_standard_error,
+)
+from src.portfolio import PortfolioVaR
+from src.simulation import SimulationResult
 from scipy import stats
+from typing import Dict, Iterable
 
+# Price quantiles of the fan chart, in pairs around the median
+FAN_QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
 
-def component_var():
-    pass
+
+def component_var(
+    returns_panel: pd.DataFrame,
+    positions: Dict[str, float] | pd.Series,
+    nPeriods: int,
+    nSims: int,
+    confidence: float = 0.95,
+    seed: int | None = None,
+    n_factors: int | None = None,
+) -> pd.DataFrame:
+    # Euler decomposition of the book's VaR/ES into per-position components,
+    # all read off one set of correlated paths. The portfolio totals are
+    # appended as a final row: net position, VaR and ES. A marginal VaR is
+    # per unit of one position and has no portfolio total, so that cell is
+    # NaN.
+    result = PortfolioVaR(returns_panel, positions, n_factors=n_factors, seed=seed).run(
+        nPeriods, nSims, confidence
+    )
+    components = result["components"]
+    components.loc["Portfolio"] = [
+        components.position.sum(),
+        np.nan,
+        result["var"],
+        1.0,
+        result["es"],
+    ]
+    return components
+
+
+def var_term_structure(
+    price_paths: SimulationResult,
+    confidence: float | Iterable[float] = (0.95, 0.99),
+    quantiles: Iterable[float] = FAN_QUANTILES,
+    control_means: np.ndarray | None = None,
+) -> pd.DataFrame:
+    # VaR and ES of the loss from the last close to every row of one set of
+    # paths, and the price quantiles of a fan chart, indexed by time. Equally
+    # weighted paths take one np.partition per time slice; importance-sampled
+    # ones, or control variates given E[S_t] per row in control_means, a
+    # LossDigest per slice.
+    if price_paths.weights is not None and control_means is not None:
+        raise ValueError("Control variates need equally weighted paths")
+    confidence = np.atleast_1d(np.asarray(confidence, dtype=np.float64))
+    quantiles = np.asarray(quantiles, dtype=np.float64)
+    prices = price_paths.prices
+    start = prices[0, 0]
+    if price_paths.weights is None and control_means is None:
+        price_quantiles, tail_means = slice_quantiles(
+            prices, np.r_[quantiles, 1 - confidence], 1 - confidence
+        )
+        bands = price_quantiles[:, : quantiles.size]
+        var = start - price_quantiles[:, quantiles.size :]
+        es = start - tail_means
+    else:
+        bands = np.empty((len(prices), quantiles.size))
+        var = np.empty((len(prices), confidence.size))
+        es = np.empty_like(var)
+        for i, row in enumerate(prices):
+            weights = price_paths.weights
+            if control_means is not None:
+                weights = control_variate_weights(row, control_means[i]) * row.size
+            digest = LossDigest().update(start - row, weights)
+            var[i] = digest.quantile(confidence)
+            es[i] = digest.expected_shortfall(confidence)
+            bands[i] = start - digest.quantile(1 - quantiles)
+
+    term = pd.DataFrame({"period": price_paths.periods}, index=pd.DatetimeIndex(price_paths.times))
+    for j, level in enumerate(confidence):
+        term[f"var_{100 * level:g}"] = var[:, j]
+        term[f"es_{100 * level:g}"] = es[:, j]
+    for j, level in enumerate(quantiles):
+        term[f"p{100 * level:g}"] = bands[:, j]
+    return term
 
 
 def produce_var_results(
-    price_paths: pd.DataFrame, returns: pd.DataFrame, save_path: str | bool | None = None
+    price_paths: SimulationResult,
+    returns: pd.DataFrame,
+    save_path: str | bool | None = None,
+    control_mean: float | None = None,
+    n_batches: int = 20,
+    batch_size: int | None = None,
 ):
-    final_values = price_paths.iloc[-1].values
-    losses = sorted(returns.close.iloc[-1] - final_values)
-    var_res = [np.percentile(losses, i) for i in range(1, 101)]
+    final_values = price_paths.final
+    # Batches give the Monte Carlo standard error; the merged digest gives the
+    # point estimates. With a control mean the terminal price is used as a
+    # control variate, and importance-sampled paths are weighted by their
+    # likelihood ratios.
+    batches = batch_digests(
+        returns.close.iloc[-1] - final_values,
+        n_batches,
+        weights=price_paths.weights,
+        controls=final_values,
+        control_mean=control_mean,
+        batch_size=batch_size,
+    )
+    digest = merge_digests(batches)
+    percentiles = np.r_[np.arange(1, 100), 99.5, 99.9, 99.97, 100]
+    var_res = digest.var_curve(percentiles)
+    var_95, var_999 = digest.quantile([0.95, 0.999])
+    es_95, es_999 = digest.expected_shortfall([0.95, 0.999])
+    var_95_se, var_999_se = var_standard_error(batches, [0.95, 0.999])
+    plain_paths = len(final_values) * (iid_standard_error(digest, 0.95) / var_95_se) ** 2
 
-    max_price_col = np.argmax(final_values == max(final_values))
-    min_price_col = np.argmax(final_values == min(final_values))
+    max_price_col = np.argmax(final_values)
+    min_price_col = np.argmin(final_values)
 
-    max_price_path = price_paths[f"sim_{1 + max_price_col}"]
-    min_price_path = price_paths[f"sim_{1 + min_price_col}"]
+    max_price_path = price_paths.prices[:, max_price_col]
+    min_price_path = price_paths.prices[:, min_price_col]
 
     fig = make_subplots(
         rows=2,
@@ -33,25 +140,52 @@ def produce_var_results(
         ],
     )
 
-    # Simulated price paths
+    # Simulated price paths over their fan of price quantiles
     # X - -
     # - - -
+    term = var_term_structure(price_paths, 0.95)
+    for lower, upper, opacity in (("p5", "p95", 0.15), ("p25", "p75", 0.3)):
+        fig.add_trace(
+            go.Scatter(
+                x=term.index, y=term[lower], line={"width": 0}, showlegend=False, hoverinfo="skip"
+            ),
+            row=1,
+            col=1,
+        )
+        fig.add_trace(
+            go.Scatter(
+                x=term.index,
+                y=term[upper],
+                fill="tonexty",
+                fillcolor=f"rgba(0, 135, 255, {opacity})",
+                line={"width": 0},
+                name=f"{lower[1:]}-{upper[1:]}th percentile",
+            ),
+            row=1,
+            col=1,
+        )
+    fig.add_trace(
+        go.Scatter(x=term.index, y=term.p50, line={"dash": "dot", "color": "black"}, name="Median"),
+        row=1,
+        col=1,
+    )
+
     fig.add_trace(
-        go.Scatter(x=price_paths.index, y=max_price_path, name="Max price path"),
+        go.Scatter(x=price_paths.times, y=max_price_path, name="Max price path"),
         row=1,
         col=1,
     )
 
     fig.add_trace(
-        go.Scatter(x=price_paths.index, y=min_price_path, name="Min price path"),
+        go.Scatter(x=price_paths.times, y=min_price_path, name="Min price path"),
         row=1,
         col=1,
     )
 
-    for i in 1 + (np.random.random(3) * (len(price_paths.columns))):
+    for i in np.random.random(3) * price_paths.nSims:
         fig.add_trace(
             go.Scatter(
-                x=price_paths.index, y=price_paths[f"sim_{int(i)}"], showlegend=False
+                x=price_paths.times, y=price_paths.prices[:, int(i)], showlegend=False
             ),
             row=1,
             col=1,
@@ -65,7 +199,7 @@ def produce_var_results(
     # - - -
     fig.add_trace(
         go.Scatter(
-            x=np.arange(1, 101),
+            x=percentiles,
             y=var_res,
             mode="lines",
             line={"color": "black"},
@@ -75,7 +209,7 @@ def produce_var_results(
         col=2,
     )
     fig.add_vline(
-        x=5,
+        x=95,
         line_dash="dash",
         line_color="red",
         label={"text": "P95 Losses", "textposition": "top right"},
@@ -97,9 +231,9 @@ def produce_var_results(
     # Final Prices distribution
     # - - X
     # - - -
-    final_prices = price_paths.iloc[-1]
+    final_prices = price_paths.final
     x_range = np.linspace(final_prices.min(), final_prices.max(), 100)
-    normal_dist = stats.norm.pdf(x_range, final_prices.mean(), final_prices.std())
+    normal_dist = stats.norm.pdf(x_range, final_prices.mean(), final_prices.std(ddof=1))
 
     fig.add_trace(
         go.Histogram(
@@ -146,8 +280,8 @@ def produce_var_results(
         go.Table(
             cells = dict(
                 values = [
-                    ["# Periods","# Simulations","Max price", "Min price", "Average price", "P95 Loss"],
-                    [len(price_paths),len(final_values),dollar_format(max(final_values)),dollar_format(min(final_values)), dollar_format(np.mean(final_values)),dollar_format(var_res[4])]
+                    ["# Periods","# Simulations","Max price", "Min price", "Average price", "P95 Loss", "P95 Loss std. error", "Equivalent plain paths", "P95 ES", "P99.9 Loss", "P99.9 Loss std. error", "P99.9 ES"],
+                    [len(price_paths),len(final_values),dollar_format(final_values.max()),dollar_format(final_values.min()), dollar_format(returns.close.iloc[-1] - digest.mean),dollar_format(var_95),dollar_format(var_95_se),f"{plain_paths:,.0f}" if np.isfinite(plain_paths) else "n/a",dollar_format(es_95),dollar_format(var_999),dollar_format(var_999_se),dollar_format(es_999)]
                 ]
             )
         ),
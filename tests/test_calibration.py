@@ -0,0 +1,37 @@
+import asyncio
+import numpy as np
+import pytest
+from pathlib import Path
+from scipy.optimize import OptimizeResult
+from src import calibration
+from src.ohlc import read_ohlc
+from src.processes import Processes
+
+
+@pytest.fixture(scope="module")
+def flat():
+    returns = read_ohlc(Path(__file__).resolve().parents[1] / "test_data.csv")
+    for column in ("open", "high", "low", "close"):
+        returns[column] = 100.0
+    returns["log_returns"] = np.r_[np.nan, np.zeros(len(returns) - 1)]
+    return returns.dropna()
+
+
+@pytest.mark.parametrize("dtype", ["float64", "float32"])
+def test_every_engine_simulates_a_constant_price_series(flat, dtype):
+    # Zero variance fits must not break the comparison of all engines
+    proc = Processes(flat, 1, executor="inline", dtype=dtype)
+    simulations = asyncio.run(proc.simulate_all(12, 1000))
+    assert set(simulations) == {"GBM", "JDP", "OU", "GARCH", "HESTON"}
+    for result in simulations.values():
+        np.testing.assert_allclose(result.prices, 100.0, rtol=1e-6)
+    assert len(proc.comparison_table(simulations)) == 5
+
+
+def test_failed_garch_fit_falls_back_to_constant_variance(monkeypatch):
+    log_returns = np.random.default_rng(0).standard_normal(500) * 0.01
+    failed = OptimizeResult(x=np.array([0.0, 0.1, 0.05, 0.05, 0.85]), success=False)
+    monkeypatch.setattr(calibration, "minimize", lambda *args, **kwargs: failed)
+    params = calibration.calibrate_garch(log_returns, 1.0)
+    assert (params.alpha, params.gamma, params.beta) == (0.0, 0.0, 0.0)
+    np.testing.assert_allclose([params.omega, params.variance], np.var(log_returns))
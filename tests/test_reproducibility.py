@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+from pathlib import Path
+from scipy.stats import ks_2samp
+from src.ohlc import read_ohlc
+from src.processes import STREAM_BLOCK, Processes
+from src.registry import get_engine
+from src.risk_metrics import LossDigest
+
+ENGINES = ("GBM", "JDP", "OU", "GARCH", "HESTON")
+
+# Not a whole number of stream blocks, so partial blocks are covered
+N_SIMS = 2 * STREAM_BLOCK + 1234
+
+
+@pytest.fixture(scope="module")
+def returns():
+    return read_ohlc(Path(__file__).resolve().parents[1] / "test_data.csv").dropna()
+
+
+@pytest.mark.parametrize("name", ENGINES)
+@pytest.mark.parametrize(
+    "options",
+    [{}, {"variance_reduction": ("antithetic",)}, {"importance_sampling": 0.99}, {"sampler": "sobol"}],
+)
+def test_terminal_prices_do_not_depend_on_the_split(returns, name, options):
+    # Paths are drawn per stream block, so chunking and workers cannot
+    # change them
+    reference = Processes(returns, 7, executor="inline", **options)
+    expected = reference.terminal_sample(name, 12, N_SIMS)
+    splits = [
+        dict(executor="inline", chunk_size=STREAM_BLOCK),
+        dict(executor="thread", n_workers=3, chunk_size=3 * STREAM_BLOCK),
+        dict(executor="process", n_workers=2),
+    ]
+    for split in splits:
+        got = Processes(returns, 7, **options, **split).terminal_sample(name, 12, N_SIMS)
+        for a, b in zip(expected, got):
+            np.testing.assert_array_equal(a, b)
+    # Without an exact sampler the terminal prices are the last row of the
+    # full paths
+    if get_engine(name).exact is None:
+        prices, _ = reference.price_paths(name, 12, N_SIMS)
+        np.testing.assert_allclose(expected[0], prices[-1], rtol=1e-12)
+
+
+@pytest.mark.parametrize("name", ENGINES)
+def test_price_windows_match_full_paths(returns, name):
+    proc = Processes(returns, 7, executor="inline")
+    prices, _ = proc.price_paths(name, 30, N_SIMS)
+    windows = np.vstack([w for w, _ in proc.iter_price_windows(name, 30, N_SIMS, window=7)])
+    if name in ("GBM", "GARCH", "OU"):
+        np.testing.assert_allclose(windows, prices[1:], rtol=1e-12)
+    else:
+        # Jumps and variance shocks are drawn per window: same law only
+        assert ks_2samp(windows[-1], prices[-1]).pvalue > 1e-3
+
+
+@pytest.mark.parametrize("name", ["GBM", "OU"])
+def test_exact_horizons_agree_with_stepped_paths(returns, name):
+    proc = Processes(returns, 11, executor="inline")
+    stepped, _ = proc.price_paths(name, 40, 20_000)
+    exact = proc.simulate_horizons(name, [10, 40], 20_000).prices
+    for row, period in ((1, 10), (2, 40)):
+        assert ks_2samp(exact[row], stepped[period]).pvalue > 1e-3
+
+
+@pytest.mark.parametrize("n", [1, 2, 17, 5_000, 99_999])
+def test_digest_matches_percentile_below_buffer_size(n):
+    losses = np.random.default_rng(n).standard_normal(n)
+    digest = LossDigest()
+    for part in np.array_split(losses, 4):
+        digest.update(part)
+    q = np.linspace(0, 1, 201)
+    np.testing.assert_allclose(digest.quantile(q), np.percentile(losses, 100 * q), rtol=0, atol=1e-12)
+    # Mean of the worst 5%, the straddling point taken in proportionally
+    worst = np.sort(losses)[::-1]
+    tail = 0.05 * n
+    full = int(tail)
+    expected = (worst[:full].sum() + (tail - full) * worst[min(full, n - 1)]) / tail
+    np.testing.assert_allclose(digest.expected_shortfall(0.95), expected, rtol=1e-12)
+
+
+def test_compressed_digest_keeps_extremes_and_tails():
+    losses = np.random.default_rng(3).standard_normal(1_000_000)
+    digest = LossDigest()
+    for part in np.array_split(losses, 9):
+        digest.update(part)
+    merged = LossDigest().merge(digest)
+    for d in (digest, merged):
+        np.testing.assert_array_equal(d.quantile([0, 1]), [losses.min(), losses.max()])
+        # Rank error within the documented pi sqrt(q (1 - q)) / compression
+        for q in (0.01, 0.5, 0.99, 0.999):
+            rank = np.mean(losses <= d.quantile(q))
+            assert abs(rank - q) < np.pi * np.sqrt(q * (1 - q)) / d.compression + 1e-5